@@ -4,7 +4,14 @@ features from a given text to be represented as shingles or hashed
 functions.
 """
 
-from .minhash import MinhashLSH
+from .minhash import (
+    MinhashLSH, get_signature, get_signatures, get_weighted_signatures,
+    pack_bits, unpack_bits
+)
 from .shingles import (
-    k_shingles, hashed_shingles, word_shingles, hashed_word_shingles
+    k_shingles, hashed_shingles, rolling_shingles, word_shingles,
+    hashed_word_shingles, WordShingler
+)
+from .projections import (
+    random_hyperplanes, simhash_signatures, pstable_signatures
 )
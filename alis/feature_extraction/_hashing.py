@@ -0,0 +1,230 @@
+"""
+Hash functions used to map shingles into integer buckets.
+
+Each backend takes a list of byte strings and a seed and returns their
+integer hashes. `sha1` is the original (and default) backend, while the
+remaining ones are non-cryptographic hashes. `murmur3` and `fnv1a` are
+vectorized over the whole batch, so they only beat `sha1` when many keys
+are hashed in one call.
+"""
+
+import hashlib
+import zlib
+
+import numpy as np
+
+
+def _sha1(keys, seed=0):
+    """Return the SHA-1 hashes of `keys` as Python integers. The seed is
+    ignored to stay compatible with the original shingle hashes."""
+    return [int.from_bytes(hashlib.sha1(key).digest(), 'big')
+            for key in keys]
+
+
+def _crc32(keys, seed=0):
+    """Return the seeded 32-bit CRC of `keys`"""
+    seed = seed & 0xffffffff
+    return [zlib.crc32(key, seed) for key in keys]
+
+
+def _byte_matrix(keys, width_multiple=1):
+    """Return the zero-padded byte matrix of shape (n_keys, width) and
+    the byte length of each key"""
+    lengths = np.fromiter(map(len, keys), dtype=np.int64, count=len(keys))
+    width = int(lengths.max()) if len(keys) else 0
+    width = -(-max(width, 1) // width_multiple) * width_multiple
+    flat = np.frombuffer(b''.join(keys), dtype=np.uint8)
+    starts = np.cumsum(lengths) - lengths
+    rows = np.repeat(np.arange(len(keys)), lengths)
+    cols = np.arange(len(flat)) - np.repeat(starts, lengths)
+    matrix = np.zeros((len(keys), width), dtype=np.uint8)
+    matrix[rows, cols] = flat
+    return matrix, lengths
+
+
+def _rotl32(x, r):
+    """Rotate the uint32 array `x` left by `r` bits"""
+    return (x << np.uint32(r)) | (x >> np.uint32(32 - r))
+
+
+def _murmur3(keys, seed=0):
+    """Return the MurmurHash3 (x86, 32-bit) hashes of `keys`
+
+    All keys are processed at once, one 4-byte block column at a time.
+    """
+    c1 = np.uint32(0xcc9e2d51)
+    c2 = np.uint32(0x1b873593)
+    matrix, lengths = _byte_matrix(keys, width_multiple=4)
+    blocks = matrix.view('<u4').astype(np.uint32)
+    n_blocks = lengths // 4
+    has_tail = lengths % 4 != 0
+
+    h = np.full(len(keys), seed & 0xffffffff, dtype=np.uint32)
+    for j in range(blocks.shape[1]):
+        k = _rotl32(blocks[:, j] * c1, 15) * c2
+        body = _rotl32(h ^ k, 13) * np.uint32(5) + np.uint32(0xe6546b64)
+        # Padding bytes are zero, so the last partial block is the tail
+        tail = h ^ k
+        h = np.where(j < n_blocks, body,
+                     np.where((j == n_blocks) & has_tail, tail, h))
+
+    # Finalization mix
+    h ^= lengths.astype(np.uint32)
+    h ^= h >> np.uint32(16)
+    h *= np.uint32(0x85ebca6b)
+    h ^= h >> np.uint32(13)
+    h *= np.uint32(0xc2b2ae35)
+    h ^= h >> np.uint32(16)
+    return h
+
+
+def _fnv1a(keys, seed=0):
+    """Return the seeded 64-bit FNV-1a hashes of `keys`
+
+    All keys are processed at once, one byte column at a time. The seed
+    is mixed into the FNV offset basis.
+    """
+    prime = np.uint64(0x100000001b3)
+    basis = (0xcbf29ce484222325 ^ (seed * 0x9e3779b97f4a7c15)) % 2**64
+    matrix, lengths = _byte_matrix(keys)
+
+    h = np.full(len(keys), basis, dtype=np.uint64)
+    for j in range(matrix.shape[1]):
+        updated = (h ^ matrix[:, j].astype(np.uint64)) * prime
+        h = np.where(j < lengths, updated, h)
+    return h
+
+
+def fmix64(h):
+    """Return the MurmurHash3 64-bit finalization mix of the uint64 array
+    `h`"""
+    h = h ^ (h >> np.uint64(33))
+    h = h * np.uint64(0xff51afd7ed558ccd)
+    h = h ^ (h >> np.uint64(33))
+    h = h * np.uint64(0xc4ceb9fe1a85ec53)
+    return h ^ (h >> np.uint64(33))
+
+
+def rolling_hash(codes, k, seed=0):
+    r"""Return the polynomial (Rabin-Karp) hashes of all windows of size
+    `k` of the integer sequence `codes`
+
+    The window hashes $\sum_j c_{i+j} B^{k-1-j} \mod 2^{64}$ are
+    obtained in O(len(codes)) from prefix sums of $c_t B^{-t}$, which
+    exist because the base $B$ is odd. The hashes are then passed
+    through a finalization mix to spread their bits.
+
+    Parameters
+    ----------
+    codes : array of shape (m,)
+        Integer sequence, e.g., the code points of a text
+    k : int
+        Window size
+    seed : int, default=0
+        Seed from which the base of the polynomial is derived
+
+    Returns
+    -------
+    hashes : uint64 array of shape (max(m - k + 1, 0),)
+        Hash of each window
+    """
+    n_windows = len(codes) - k + 1
+    if k < 1 or n_windows <= 0:
+        return np.empty(0, dtype=np.uint64)
+
+    # Odd base derived from the seed and its inverse modulo 2**64
+    state = (0x9e3779b97f4a7c15 * (seed + 1)) % 2**64
+    base = int(fmix64(np.array([state], dtype=np.uint64))[0]) | 1
+    inverse = pow(base, -1, 2**64)
+
+    # powers[t] = B**t and inverse_powers[t] = B**-t (mod 2**64)
+    powers = np.full(len(codes), base, dtype=np.uint64)
+    powers[0] = 1
+    powers = np.cumprod(powers, dtype=np.uint64)
+    inverse_powers = np.full(len(codes), inverse, dtype=np.uint64)
+    inverse_powers[0] = 1
+    inverse_powers = np.cumprod(inverse_powers, dtype=np.uint64)
+
+    prefix = np.zeros(len(codes) + 1, dtype=np.uint64)
+    np.cumsum(np.asarray(codes, dtype=np.uint64) * inverse_powers,
+              dtype=np.uint64, out=prefix[1:])
+    hashes = (prefix[k:] - prefix[:-k]) * powers[k - 1:]
+    return fmix64(hashes)
+
+
+def sorted_unique(values):
+    """Return the sorted distinct elements of the 1-D array `values`"""
+    values = np.sort(values)
+    if len(values) == 0:
+        return values
+    return values[np.concatenate(([True], values[1:] != values[:-1]))]
+
+
+# Number of set bits of every byte value
+_POPCOUNT_TABLE = np.array([bin(i).count('1') for i in range(256)],
+                           dtype=np.uint8)
+
+
+def popcount(words):
+    """Return the number of set bits of each element of the unsigned
+    integer array `words`
+
+    Uses `np.bitwise_count` when available (NumPy >= 2.0) and a byte
+    lookup table otherwise.
+    """
+    words = np.asarray(words)
+    if hasattr(np, 'bitwise_count'):
+        return np.bitwise_count(words)
+    words = np.ascontiguousarray(words)
+    counts = _POPCOUNT_TABLE[words.view(np.uint8)]
+    return counts.reshape(words.shape + (words.itemsize,)).sum(
+        axis=-1, dtype=np.uint8)
+
+
+HASH_METHODS = {
+    'sha1': _sha1,
+    'crc32': _crc32,
+    'murmur3': _murmur3,
+    'fnv1a': _fnv1a,
+}
+
+
+def hash_texts(texts, n, hash_method='sha1', seed=0):
+    """Return the integer hashes of `texts` in the range 0 to 2**n - 1
+
+    Parameters
+    ----------
+    texts : list of str
+        Texts whose hash representations are to be computed
+    n : int
+        The number definining the bucket size: 2**n - 1
+    hash_method : str or callable, default='sha1'
+        Hash function to use. One of `'sha1'`, `'crc32'` (32-bit),
+        `'murmur3'` (32-bit) or `'fnv1a'` (64-bit); or a callable
+        taking a list of byte strings and a seed and returning their
+        integer hashes.
+    seed : int, default=0
+        Seed of the hash function. Ignored by `'sha1'`.
+
+    Returns
+    -------
+    hashed_ints : list of int
+        Hashed representation of each text
+    """
+    if callable(hash_method):
+        backend = hash_method
+    elif hash_method in HASH_METHODS:
+        backend = HASH_METHODS[hash_method]
+    else:
+        raise ValueError(
+            f"Unknown hash method {hash_method!r}, expected one of "
+            f"{sorted(HASH_METHODS)} or a callable")
+
+    keys = [text.encode('utf-8') for text in texts]
+    if not keys:
+        return []
+    hashed = backend(keys, seed)
+    bucket = 2**n - 1
+    if isinstance(hashed, np.ndarray) and bucket < 2**64:
+        return (hashed.astype(np.uint64) % np.uint64(bucket)).tolist()
+    return [int(h) % bucket for h in hashed]
@@ -6,4 +6,6 @@ This module contains functions and classes that will be useful in
 creating the minhash signature given a dask bag of texts.
 """
 
-from ._base import MinhashLSH
+from ._base import MinhashLSH, get_signature, get_signatures
+from ._bbit import pack_bits, unpack_bits
+from ._weighted import get_weighted_signatures
@@ -2,11 +2,246 @@
 Class definition for Minhash signature extraction 
 """
 
-from ..shingles import hashed_word_shingles
-from .hash_functions import create_hash_functions
+import os
+import uuid
+from collections import deque
+from concurrent.futures import Executor, ProcessPoolExecutor
+from functools import lru_cache, partial
+from itertools import islice
 
+import numpy as np
 
-def get_signature(nonzero_rows, num_hash, hash_size=None, seed=1337):
+from .._hashing import fmix64, hash_texts
+from ..shingles import word_shingles
+from ._bbit import pack_bits
+from .hash_functions import hash_parameters
+
+# Maximum number of (shingle, hash function) values evaluated at once by
+# the vectorized signature engine
+_CHUNK_SIZE = 2**22
+
+SIGNATURE_METHODS = ('minhash', 'one_permutation')
+
+# Parameters of the extractors, set once per worker by `_init_worker` and
+# keyed by a token of the pool, since the workers of a thread pool share
+# them with every other pool of their process
+_WORKER_KWARGS = {}
+
+
+def _as_shingle_ids(nonzero_rows):
+    """Return the given shingle ids as a 1-D uint64 array"""
+    if isinstance(nonzero_rows, (set, frozenset)):
+        return np.fromiter(nonzero_rows, dtype=np.uint64,
+                           count=len(nonzero_rows))
+    return np.asarray(nonzero_rows, dtype=np.uint64).ravel()
+
+
+def _min_hash(values, offsets, num_hash, hash_size=None, seed=1337):
+    r"""Return the minhash signatures of the documents whose shingle ids
+    are `values[offsets[i]:offsets[i+1]]`
+
+    All `num_hash` universal hash functions are evaluated as a single
+    broadcast $(ax + b) \mod (D - 1)$ over a chunk of shingle ids and
+    the minimum is taken per document via `np.minimum.reduceat`. Since
+    $a$, $b$ and $x$ are first reduced modulo $D - 1$, the products fit
+    in uint64 whenever $D - 1 \le 2^{32}$; larger hash sizes fall back
+    to exact Python integer arithmetic.
+    """
+    A, B, hash_size = hash_parameters(num_hash, hash_size, seed)
+    prime = hash_size - 1
+    n_docs = len(offsets) - 1
+    if np.any(np.diff(offsets) == 0):
+        raise ValueError("Every document should have at least one shingle")
+
+    if prime <= 2**32:
+        A = (A % prime).astype(np.uint64)
+        B = (B % prime).astype(np.uint64)
+        values = values % np.uint64(prime)
+        dtype = np.uint32 if prime <= 2**32 - 1 else np.uint64
+    else:
+        A = np.array([int(a) for a in A], dtype=object)
+        B = np.array([int(b) for b in B], dtype=object)
+        values = values.astype(object)
+        dtype = np.uint64 if prime <= 2**64 else object
+
+    # Initialize with a value larger than every possible hash value
+    signature = np.full((n_docs, num_hash), prime, dtype=dtype)
+    chunk = max(1, _CHUNK_SIZE // max(num_hash, 1))
+    for lo in range(0, len(values), chunk):
+        hi = min(lo + chunk, len(values))
+        # Documents overlapping the rows [lo, hi)
+        first = np.searchsorted(offsets, lo, side='right') - 1
+        last = np.searchsorted(offsets, hi, side='left')
+        starts = np.maximum(offsets[first:last], lo) - lo
+        hashed = (A * values[lo:hi, None] + B) % prime
+        partial = np.minimum.reduceat(hashed, starts, axis=0)
+        signature[first:last] = np.minimum(signature[first:last], partial)
+    return signature
+
+
+def _universal_hash(values, hash_size=None, seed=1337):
+    """Return the values of the universal hash function drawn by
+    `hash_parameters(1, hash_size, seed)`, along with its modulus D - 1
+
+    Note that this function differs from the first hash function used
+    by `_min_hash`, whose coefficients are drawn along with those of the
+    other `num_hash - 1` functions.
+    """
+    A, B, hash_size = hash_parameters(1, hash_size, seed)
+    prime = hash_size - 1
+    if prime <= 2**32:
+        a = np.uint64(int(A[0]) % prime)
+        b = np.uint64(int(B[0]) % prime)
+        hashed = (a * (values % np.uint64(prime)) + b) % np.uint64(prime)
+        return hashed, prime
+    values = values.astype(object)
+    return (int(A[0]) * values + int(B[0])) % prime, prime
+
+
+@lru_cache(maxsize=128)
+def _probe_shifts(num_hash, seed, num_attempts):
+    """Return the read-only array of shape (num_attempts, num_hash) whose
+    entry `[k, i]` is the offset from the empty bin `i` of the bin probed
+    at its `k`-th attempt
+    """
+    salt = np.uint64((0x9e3779b97f4a7c15 * (seed + 1)) % 2**64)
+    bins = np.arange(num_hash, dtype=np.uint64)
+    attempts = np.arange(num_attempts, dtype=np.uint64)[:, None]
+    probes = (fmix64(((bins << np.uint64(32)) | attempts) ^ salt)
+              % np.uint64(num_hash)).astype(np.int64)
+    shifts = probes - np.arange(num_hash)
+    shifts.setflags(write=False)
+    return shifts
+
+
+def _densify(signature, filled, seed=1337):
+    """Fill the empty bins of one permutation hash signatures in place
+
+    Each empty bin borrows the value of the first non-empty bin along a
+    pseudo-random probe sequence (optimal densification). The sequence
+    only depends on the bin and the seed, so documents sharing a
+    non-empty bin also share the values borrowed from it. The sequences
+    are computed once per `(num_hash, seed)` by `_probe_shifts`.
+    """
+    num_hash = signature.shape[1]
+    values, filled = signature.reshape(-1), filled.reshape(-1)
+    empty = np.flatnonzero(~filled)
+    cols = empty % num_hash
+    num_attempts = 32
+    shifts = _probe_shifts(num_hash, seed, num_attempts)
+    attempt = 0
+    while len(empty):
+        if attempt == num_attempts:
+            num_attempts *= 2
+            shifts = _probe_shifts(num_hash, seed, num_attempts)
+        candidate = empty + shifts[attempt][cols]
+        found = filled[candidate]
+        values[empty[found]] = values[candidate[found]]
+        missing = np.flatnonzero(~found)
+        empty, cols = empty[missing], cols[missing]
+        attempt += 1
+    return signature
+
+
+def _one_permutation_hash(values, offsets, num_hash, hash_size=None,
+                          seed=1337):
+    """Return the densified one permutation hash signatures of the
+    documents whose shingle ids are `values[offsets[i]:offsets[i+1]]`
+
+    Each shingle is hashed once and the hash range is split into
+    `num_hash` equal bins; the signature keeps the minimum hash falling
+    into each bin and the empty bins are filled by `_densify`.
+    """
+    n_docs = len(offsets) - 1
+    if np.any(np.diff(offsets) == 0):
+        raise ValueError("Every document should have at least one shingle")
+
+    hashed, prime = _universal_hash(values, hash_size, seed)
+    if hashed.dtype == object:
+        bins = (hashed * num_hash // prime).astype(np.int64)
+        dtype = np.uint64 if prime <= 2**64 else object
+    else:
+        bins = (hashed * np.uint64(num_hash) // np.uint64(prime)).astype(
+            np.int64)
+        dtype = np.uint32 if prime <= 2**32 - 1 else np.uint64
+        hashed = hashed.astype(dtype)
+    docs = np.repeat(np.arange(n_docs), np.diff(offsets))
+
+    signature = np.full(n_docs * num_hash, prime, dtype=dtype)
+    np.minimum.at(signature, docs * num_hash + bins, hashed)
+    filled = np.zeros(n_docs * num_hash, dtype=bool)
+    filled[docs * num_hash + bins] = True
+    return _densify(signature.reshape(n_docs, num_hash),
+                    filled.reshape(n_docs, num_hash), seed)
+
+
+def get_signatures(documents, num_hash, hash_size=None, seed=1337,
+                   method='minhash', num_bits=None):
+    r"""Return the minhash signatures of a batch of documents, each given
+    by the indices of its rows with non-zero values
+
+    This is the vectorized counterpart of `get_signature`. For the same
+    `seed`, it produces the same signature values as the hash functions
+    of `create_hash_functions` as long as their int64 products $a x$ do
+    not overflow, i.e., for shingle ids below 2**31 (word shingles with
+    `num_shingle_bucket` of at most 31). Larger ids silently overflowed
+    in those hash functions, whereas the exact universal hash is
+    computed here, so the signatures of such ids intentionally differ.
+
+    Parameters
+    ----------
+    documents : iterable of iterable of int
+        Iterable containing, for each document, the indices of rows
+        with non-zero values (e.g., the output of `hashed_word_shingles`
+        or an integer array of shingle ids)
+    num_hash : int
+        Number of hash fucntions to generate
+    hash_size : int, default=None
+        Range of the hash function D. If not specified, this defaults
+        to 2**32
+    seed : int, default=1337
+        Random seed to use during random number generation
+    method : {'minhash', 'one_permutation'}, default='minhash'
+        `'minhash'` applies `num_hash` hash functions to every shingle.
+        `'one_permutation'` hashes every shingle once, splits the hash
+        range into `num_hash` bins and keeps the minimum of each bin,
+        filling the empty bins by densification. Both estimate the
+        Jaccard similarity by the fraction of equal signature values.
+    num_bits : {1, 2, 4, 8}, default=None
+        If given, only the lowest `num_bits` bits of each signature
+        value are kept and packed into uint64 words via `pack_bits`.
+        Use `bbit_jaccard_sim` to estimate similarities from them.
+
+    Returns
+    -------
+    signatures : array of shape (n_docs, num_hash)
+        Minhash signature of each document. The values are stored as
+        uint32 for the default hash size and uint64 for larger ones.
+        If `num_bits` is given, the packed uint64 array of shape
+        (n_docs, ceil(num_hash * num_bits / 64)) is returned instead.
+    """
+    shingle_ids = [_as_shingle_ids(doc) for doc in documents]
+    offsets = np.zeros(len(shingle_ids) + 1, dtype=np.int64)
+    np.cumsum([len(ids) for ids in shingle_ids], out=offsets[1:])
+    if shingle_ids:
+        values = np.concatenate(shingle_ids)
+    else:
+        values = np.empty(0, dtype=np.uint64)
+    if method == 'minhash':
+        signatures = _min_hash(values, offsets, num_hash, hash_size, seed)
+    elif method == 'one_permutation':
+        signatures = _one_permutation_hash(values, offsets, num_hash,
+                                           hash_size, seed)
+    else:
+        raise ValueError(f"Unknown signature method {method!r}, expected "
+                         f"one of {list(SIGNATURE_METHODS)}")
+    if num_bits is not None:
+        return pack_bits(signatures, num_bits)
+    return signatures
+
+
+def get_signature(nonzero_rows, num_hash, hash_size=None, seed=1337,
+                  method='minhash'):
     """Return the hash signature of the given document with the nonzero
     row indices specified by `nonzero_rows`.
 
@@ -24,16 +259,16 @@ def get_signature(nonzero_rows, num_hash, hash_size=None, seed=1337):
         to 2**32
     seed : int, default=1337
         Random seed to use during random number generation
+    method : {'minhash', 'one_permutation'}, default='minhash'
+        Signature scheme, see `get_signatures`
 
     Returns
     -------
     signature : list of int
         List containing the minhash signature of the document
     """
-    hash_functions = create_hash_functions(num_hash, hash_size, seed)
-
-    return [min(hash_function(x) for x in nonzero_rows)
-            for hash_function in hash_functions]
+    return get_signatures([nonzero_rows], num_hash, hash_size,
+                          seed, method)[0].tolist()
 
 
 class MinhashLSH:
@@ -56,10 +291,15 @@ class MinhashLSH:
         to 2**32
     seed : int, default=1337
         Random seed to use during random number generation
+    hash_method : str or callable, default='sha1'
+        Hash function used to hash the word shingles into buckets
+    method : {'minhash', 'one_permutation'}, default='minhash'
+        Signature scheme, see `get_signatures`
     """
 
     def __init__(self, shingle_size, num_shingle_bucket, num_hash,
-                 hash_size=None, stop_words=None, seed=1337):
+                 hash_size=None, stop_words=None, seed=1337,
+                 hash_method='sha1', method='minhash'):
         """Initialize the Minhash LSH signature extractor
 
         Parameters
@@ -80,6 +320,15 @@ class MinhashLSH:
             stopwords defined by sklearn
         seed : int, default=1337
             Random seed to use during random number generation
+        hash_method : str or callable, default='sha1'
+            Hash function used to hash the word shingles into buckets:
+            `'sha1'`, or one of the non-cryptographic `'crc32'`,
+            `'murmur3'` and `'fnv1a'`. The shingles of a partition are
+            hashed in a single batch, where all three are faster than
+            `'sha1'`.
+        method : {'minhash', 'one_permutation'}, default='minhash'
+            Signature scheme. `'one_permutation'` hashes each shingle
+            once instead of `num_hash` times; see `get_signatures`.
         """
         self.shingle_size = shingle_size
         self.num_shingle_bucket = num_shingle_bucket
@@ -87,6 +336,8 @@ class MinhashLSH:
         self.hash_size = hash_size
         self.stop_words = stop_words
         self.seed = seed
+        self.hash_method = hash_method
+        self.method = method
 
     def transform(self, db_text):
         """Return a dask bag containing the minhash signatures of
@@ -106,22 +357,216 @@ class MinhashLSH:
             db_text.map(lambda x: (x[0], map_function(x[1], **kwargs)))
             ```
 
+            The signatures are computed per partition via
+            `transform_partitions`.
+
         Returns
         -------
         db_minhash : dask.bag object
             Dask bag object containing the minhash signature of each
-            document along with its identifier.
+            document, as a 1-D numpy array, along with its identifier.
+        """
+        return self.transform_partitions(db_text).map_partitions(
+            _unstack_blocks)
+
+    def transform_partitions(self, db_text):
+        """Return a dask bag containing one block of minhash signatures
+        per partition of the given dask bag of text
+
+        Each partition is shingled and minhashed in one go, so the
+        scheduler handles one task per partition instead of one per
+        document. Only the parameters of the extractor, not the extractor
+        itself, are shipped with each task.
+
+        Parameters
+        ----------
+        db_text : dask.bag object
+            Dask bag object containing texts and their document
+            identifier. Each element in the dask bag will be a tuple
+            with the first element being the identifier and the
+            second element being the text.
+
+        Returns
+        -------
+        db_blocks : dask.bag object
+            Dask bag object with a single `(ids, signatures)` tuple per
+            partition, where `ids` is an array of shape (n_docs,) of
+            document identifiers and `signatures` is an array of shape
+            (n_docs, num_hash) of their minhash signatures. Documents
+            without any shingle are dropped.
+        """
+        return db_text.map_partitions(
+            _minhash_partition, **self._partition_kwargs())
+
+    def transform_matrix(self, texts, backend='process', n_jobs=None,
+                         chunk_size=1024, executor=None, max_pending=None):
+        """Return the minhash signatures of the given texts as a single
+        contiguous matrix
+
+        Parameters
+        ----------
+        texts : iterable or dask.bag object
+            `(identifier, text)` tuples
+        backend : {'process', 'serial', 'dask'}, default='process'
+            'process' minhashes chunks of texts in a
+            `concurrent.futures` executor (see `executor`). 'serial'
+            processes the chunks in the current process and 'dask' maps
+            them over the partitions of a dask bag (`texts` is
+            converted with `dask.bag.from_sequence` if needed).
+        n_jobs : int, default=None
+            number of workers of the executor created by the 'process'
+            backend. If None, the number of CPUs is used.
+        chunk_size : int, default=1024
+            number of texts per task
+        executor : concurrent.futures.Executor or callable, default=None
+            executor of the 'process' backend. A callable is treated as
+            an executor factory, e.g., `ThreadPoolExecutor`, and is
+            called with `max_workers`, `initializer` and `initargs` so
+            that its workers receive the parameters of the extractor
+            once, when they start, under a token unique to the call; the
+            executor is shut down afterwards.
+            An `Executor` instance is used as is and left running, and
+            each of its tasks carries the parameters along with its
+            chunk of texts. If None, a `ProcessPoolExecutor` is created.
+        max_pending : int, default=None
+            maximum number of chunks submitted to the executor and not
+            yet collected, which bounds the memory held by the pending
+            chunks and their signatures. If None, twice the number of
+            workers is used.
+
+        Returns
+        -------
+        ids : np.array of shape (n_docs,)
+            document identifiers. Documents without any shingle are
+            dropped.
+        signatures : np.array of shape (n_docs, num_hash)
+            C-contiguous matrix of the minhash signatures
         """
-        word_shingles = db_text.map(lambda x: (
-            x[0],
-            hashed_word_shingles(
-                x[1], self.shingle_size,
-                self.num_shingle_bucket, self.stop_words)
-            )
-        ).filter(lambda x: len(x[1]) > 0)
-        db_minhash = word_shingles.map(lambda x: (
-            x[0],
-            get_signature(x[1], self.num_hash, self.hash_size, self.seed)
-            )
+        kwargs = self._partition_kwargs()
+        if backend == 'dask':
+            import dask.bag as db
+            if not isinstance(texts, db.Bag):
+                texts = db.from_sequence(
+                    texts, partition_size=chunk_size)
+            blocks = self.transform_partitions(texts).compute()
+        elif backend == 'serial':
+            blocks = [_minhash_partition(chunk, **kwargs)[0]
+                      for chunk in _chunks(texts, chunk_size)]
+        elif backend == 'process':
+            if max_pending is None:
+                max_pending = 2 * (n_jobs or os.cpu_count() or 1)
+            elif max_pending < 1:
+                raise ValueError("max_pending should be at least 1")
+            chunks = _chunks(texts, chunk_size)
+            if isinstance(executor, Executor):
+                blocks = list(_bounded_map(
+                    executor, partial(_minhash_worker_chunk, kwargs=kwargs),
+                    chunks, max_pending))
+            else:
+                factory = ProcessPoolExecutor if executor is None else executor
+                token = uuid.uuid4().hex
+                try:
+                    with factory(max_workers=n_jobs,
+                                 initializer=_init_worker,
+                                 initargs=(token, kwargs)) as pool:
+                        blocks = list(_bounded_map(
+                            pool, partial(_minhash_worker_chunk, token=token),
+                            chunks, max_pending))
+                finally:
+                    # workers of a thread pool stored them in this process
+                    _WORKER_KWARGS.pop(token, None)
+        else:
+            raise ValueError("backend should be one of 'process', 'serial' "
+                             "or 'dask'")
+
+        blocks = [(ids, signatures) for ids, signatures in blocks
+                  if len(ids)]
+        if not blocks:
+            return np.empty(0, dtype=object), get_signatures(
+                [], self.num_hash, self.hash_size, self.seed, self.method)
+        ids = np.concatenate([ids for ids, _ in blocks])
+        signatures = np.concatenate([sig for _, sig in blocks])
+        return ids, np.ascontiguousarray(signatures)
+
+    def _partition_kwargs(self):
+        """Return the parameters needed by `_minhash_partition`"""
+        return dict(
+            shingle_size=self.shingle_size,
+            num_shingle_bucket=self.num_shingle_bucket,
+            num_hash=self.num_hash,
+            hash_size=self.hash_size,
+            stop_words=self.stop_words,
+            seed=self.seed,
+            hash_method=self.hash_method,
+            method=self.method,
         )
-        return db_minhash
+
+
+def _minhash_partition(partition, shingle_size, num_shingle_bucket,
+                       num_hash, hash_size=None, stop_words=None,
+                       seed=1337, hash_method='sha1', method='minhash'):
+    """Return a list with the `(ids, signatures)` block of the given
+    partition of `(identifier, text)` tuples"""
+    ids = []
+    texts = []
+    offsets = [0]
+    for doc_id, text in partition:
+        doc_shingles = word_shingles(text, shingle_size, stop_words)
+        if len(doc_shingles) > 0:
+            ids.append(doc_id)
+            texts.extend(doc_shingles)
+            offsets.append(len(texts))
+    # Hash the shingles of the whole partition at once, which amortizes
+    # the per-call overhead of the vectorized hash backends
+    hashed = hash_texts(texts, num_shingle_bucket, hash_method)
+    shingles = [hashed[lo:hi] for lo, hi in zip(offsets[:-1], offsets[1:])]
+    signatures = get_signatures(shingles, num_hash, hash_size, seed, method)
+    return [(np.array(ids), signatures)]
+
+
+def _chunks(iterable, chunk_size):
+    """Yield lists of at most `chunk_size` elements of the iterable"""
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, chunk_size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _init_worker(token, kwargs):
+    """Store the extractor parameters of a pool under its token and
+    generate their hash parameters once"""
+    _WORKER_KWARGS[token] = kwargs
+    num_hash = kwargs['num_hash']
+    if kwargs['method'] == 'one_permutation':
+        num_hash = 1
+    hash_parameters(num_hash, kwargs['hash_size'], kwargs['seed'])
+
+
+def _minhash_worker_chunk(chunk, kwargs=None, token=None):
+    """Return the `(ids, signatures)` block of a chunk of texts using the
+    given parameters, or those stored by `_init_worker` under `token`"""
+    if kwargs is None:
+        kwargs = _WORKER_KWARGS[token]
+    return _minhash_partition(chunk, **kwargs)[0]
+
+
+def _bounded_map(executor, fn, iterable, max_pending):
+    """Yield `fn` applied to the elements of the iterable in order, with
+    at most `max_pending` tasks submitted to the executor at a time"""
+    pending = deque()
+    for item in iterable:
+        if len(pending) >= max_pending:
+            yield pending.popleft().result()
+        pending.append(executor.submit(fn, item))
+    while pending:
+        yield pending.popleft().result()
+
+
+def _unstack_blocks(blocks):
+    """Return the `(identifier, signature)` tuples of the given
+    partition of `(ids, signatures)` blocks"""
+    return [(doc_id, signature)
+            for ids, signatures in blocks
+            for doc_id, signature in zip(ids.tolist(), signatures)]
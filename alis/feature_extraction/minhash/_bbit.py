@@ -0,0 +1,81 @@
+"""
+Packing of b-bit minhash signatures.
+
+Only the lowest `num_bits` bits of each signature value are kept and
+`64 // num_bits` (or `8 // num_bits`) of them are packed into each word,
+which shrinks the signatures 8 to 32 times compared to uint32 values.
+"""
+
+import numpy as np
+
+BIT_WIDTHS = (1, 2, 4, 8)
+
+
+def _check_bits(num_bits, dtype):
+    """Return the number of bits and values per word of `dtype`"""
+    if num_bits not in BIT_WIDTHS:
+        raise ValueError(f"num_bits should be one of {list(BIT_WIDTHS)}")
+    word_bits = np.dtype(dtype).itemsize * 8
+    return word_bits, word_bits // num_bits
+
+
+def pack_bits(signatures, num_bits, dtype=np.uint64):
+    """Return the lowest `num_bits` bits of each signature value packed
+    into words of the given unsigned integer dtype
+
+    Parameters
+    ----------
+    signatures : array of shape (n_docs, num_hash) or (num_hash,)
+        Minhash signatures, e.g., the output of `get_signatures`
+    num_bits : {1, 2, 4, 8}
+        Number of lowest bits kept from each signature value
+    dtype : {np.uint64, np.uint8}, default=np.uint64
+        Dtype of the packed words
+
+    Returns
+    -------
+    packed : array of shape (n_docs, ceil(num_hash / values_per_word))
+        Packed signatures, where value j occupies bits
+        `(j % values_per_word) * num_bits` onwards of word
+        `j // values_per_word`. Unused trailing bits are zero.
+    """
+    word_bits, per_word = _check_bits(num_bits, dtype)
+    signatures = np.asarray(signatures)
+    num_hash = signatures.shape[-1]
+    num_words = -(-num_hash // per_word)
+
+    low = (signatures.astype(np.uint64) & np.uint64(2**num_bits - 1))
+    padded = np.zeros(signatures.shape[:-1] + (num_words * per_word,),
+                      dtype=np.uint64)
+    padded[..., :num_hash] = low
+    padded = padded.reshape(signatures.shape[:-1] + (num_words, per_word))
+    shifts = np.arange(per_word, dtype=np.uint64) * np.uint64(num_bits)
+    packed = np.bitwise_or.reduce(padded << shifts, axis=-1)
+    return packed.astype(dtype)
+
+
+def unpack_bits(packed, num_bits, num_hash):
+    """Return the b-bit signature values stored in `packed`
+
+    Parameters
+    ----------
+    packed : array of shape (n_docs, num_words) or (num_words,)
+        Packed signatures, e.g., the output of `pack_bits`
+    num_bits : {1, 2, 4, 8}
+        Number of bits per signature value
+    num_hash : int
+        Number of signature values
+
+    Returns
+    -------
+    signatures : uint8 array of shape (n_docs, num_hash)
+        The b-bit signature values
+    """
+    packed = np.asarray(packed)
+    _, per_word = _check_bits(num_bits, packed.dtype)
+    shifts = np.arange(per_word, dtype=packed.dtype) * packed.dtype.type(
+        num_bits)
+    values = (packed[..., None] >> shifts) & packed.dtype.type(
+        2**num_bits - 1)
+    values = values.reshape(packed.shape[:-1] + (-1,))
+    return values[..., :num_hash].astype(np.uint8)
@@ -0,0 +1,120 @@
+r"""
+Weighted minhash signatures via Improved Consistent Weighted Sampling.
+
+For each hash function $k$ and feature $i$ with weight $S_i > 0$, ICWS
+draws $r, c \sim \mathrm{Gamma}(2, 1)$ and $\beta \sim U(0, 1)$ and
+computes
+
+.. math::
+
+    t = \lfloor \ln S_i / r + \beta \rfloor, \qquad
+    \ln a = \ln c - r (t - \beta + 1).
+
+The sample of a document is the pair $(i^*, t_{i^*})$ minimizing $a$.
+Two documents get the same sample with probability equal to their
+generalized Jaccard similarity $\sum_i \min(x_i, y_i) /
+\sum_i \max(x_i, y_i)$.
+
+The random draws are not stored: they are derived by hashing
+(feature, hash function, draw) with `fmix64`, so that every document,
+batch and worker sees the same draws for the same seed.
+"""
+
+import numpy as np
+from scipy import sparse
+
+from .._hashing import fmix64
+
+# Maximum number of (feature, hash function) values evaluated at once
+_CHUNK_SIZE = 2**21
+
+_GOLDEN = 0x9e3779b97f4a7c15
+
+
+def _uniforms(features, num_hash, draw, seed):
+    """Return uniform draws in (0, 1) of shape (len(features), num_hash)
+    for the given draw number"""
+    salt = np.uint64((_GOLDEN * (seed + 1)) % 2**64)
+    keys = fmix64(features.astype(np.uint64) ^ salt)
+    offsets = ((np.arange(num_hash, dtype=np.uint64) * np.uint64(5)
+                + np.uint64(draw + 1)) * np.uint64(_GOLDEN))
+    bits = fmix64(keys[:, None] + offsets) >> np.uint64(11)
+    return (bits.astype(np.float64) + 0.5) * 2.0**-53
+
+
+def _icws_chunk(features, weights, starts, num_hash, seed):
+    """Return the ICWS samples of the documents whose nonzero features
+    start at the offsets `starts` of the given chunk of features"""
+    log_weights = np.log(weights)[:, None]
+    r = -np.log(_uniforms(features, num_hash, 0, seed)
+                * _uniforms(features, num_hash, 1, seed))
+    log_c = np.log(-np.log(_uniforms(features, num_hash, 2, seed)
+                           * _uniforms(features, num_hash, 3, seed)))
+    beta = _uniforms(features, num_hash, 4, seed)
+
+    t = np.floor(log_weights / r + beta)
+    log_a = log_c - r * (t - beta + 1)
+
+    # Position of the minimum of each document and hash function
+    lengths = np.diff(np.append(starts, len(features)))
+    minima = np.minimum.reduceat(log_a, starts, axis=0)
+    is_min = log_a == np.repeat(minima, lengths, axis=0)
+    positions = np.arange(len(features))[:, None]
+    argmin = np.minimum.reduceat(np.where(is_min, positions, len(features)),
+                                 starts, axis=0)
+
+    hash_idx = np.arange(num_hash)
+    k_star = features[argmin].astype(np.uint64)
+    t_star = t[argmin, hash_idx].astype(np.int64).view(np.uint64)
+    return fmix64(fmix64(k_star) ^ t_star)
+
+
+def get_weighted_signatures(X, num_hash, seed=1337):
+    """Return the weighted minhash signatures of the rows of `X` using
+    Improved Consistent Weighted Sampling (ICWS)
+
+    The fraction of equal signature values of two documents estimates
+    their generalized Jaccard similarity, so the signatures can be
+    banded by `LSH` like the minhash signatures of `get_signatures`.
+
+    Parameters
+    ----------
+    X : array or scipy.sparse matrix of shape (n_docs, n_features)
+        Non-negative feature weights of each document, e.g., TF-IDF
+        vectors or user ratings
+    num_hash : int
+        Number of signature values per document
+    seed : int, default=1337
+        Random seed from which the draws of each feature are derived
+
+    Returns
+    -------
+    signatures : uint64 array of shape (n_docs, num_hash)
+        Hash of the sampled (feature, t) pair of each document and hash
+        function
+    """
+    X = sparse.csr_matrix(X, dtype=np.float64)
+    X.eliminate_zeros()
+    X.sort_indices()
+    if X.nnz and X.data.min() < 0:
+        raise ValueError("Weights should be non-negative")
+    nnz = np.diff(X.indptr)
+    if np.any(nnz == 0):
+        raise ValueError("Every document should have at least one "
+                         "nonzero weight")
+
+    n_docs = X.shape[0]
+    signatures = np.empty((n_docs, num_hash), dtype=np.uint64)
+    max_nnz = max(1, _CHUNK_SIZE // max(num_hash, 1))
+    first = 0
+    while first < n_docs:
+        # Whole documents whose nonzero features fit in a chunk
+        limit = X.indptr[first] + max_nnz
+        last = max(first + 1, np.searchsorted(X.indptr, limit,
+                                              side='right') - 1)
+        lo, hi = X.indptr[first], X.indptr[last]
+        signatures[first:last] = _icws_chunk(
+            X.indices[lo:hi], X.data[lo:hi], X.indptr[first:last] - lo,
+            num_hash, seed)
+        first = last
+    return signatures
@@ -6,6 +6,8 @@ This module contains the hash function definition useful when creating
 minhash signatures.
 """
 
+from functools import lru_cache
+
 import numpy as np
 
 
@@ -36,19 +38,61 @@ def create_hash_functions(num_hash, hash_size=None, seed=1337):
     hash_functions : array of shape (num_hash, num_rows)
         Generated hash functions based on size parameters
     """
-    # Set random seed
-    np.random.seed(seed)
+    A, B, hash_size = hash_parameters(num_hash, hash_size, seed)
+
+    # Generate hash functions;
+    # Note we need to do this to clarify the scope of the lambda function:
+    # https://stackoverflow.com/a/34021333
+    return [(lambda y, z: (lambda x: (y*x + z) % (hash_size - 1)))(a, b)
+            for a, b in zip(A, B)]
+
 
+def hash_parameters(num_hash, hash_size=None, seed=1337):
+    """Return the random coefficients of the universal hash functions
+    generated by `create_hash_functions`
+
+    The coefficients are drawn from a private random state, leaving the
+    global numpy random state untouched, and are memoized per process
+    for each `(num_hash, hash_size, seed)`. Workers thus only need these
+    three numbers to rebuild the same hash functions.
+
+    Parameters
+    ----------
+    num_hash : int
+        Number of hash fucntions to generate
+    hash_size : int, default=None
+        Range of the hash function D. If not specified, this defaults
+        to 2**32
+    seed : int, default=1337
+        Random seed to use during random number generation
+
+    Returns
+    -------
+    A : array of shape (num_hash,)
+        Read-only array of the multiplier $a$ of each hash function
+    B : array of shape (num_hash,)
+        Read-only array of the offset $b$ of each hash function
+    hash_size : int
+        Range of the hash function D
+    """
     # Set hash size if None
     if hash_size is None:
         hash_size = 2**32
 
+    return _cached_hash_parameters(num_hash, hash_size, seed)
+
+
+@lru_cache(maxsize=128)
+def _cached_hash_parameters(num_hash, hash_size, seed):
+    """Return the memoized hash coefficients of `hash_parameters`"""
+    # Use a private RandomState so that the same seed reproduces the
+    # coefficients drawn by earlier versions via `np.random.seed`
+    random_state = np.random.RandomState(seed)
+
     # Generate random values for a and b
-    A = np.random.randint(0, hash_size, num_hash)
-    B = np.random.randint(0, hash_size, num_hash)
+    A = random_state.randint(0, hash_size, num_hash)
+    B = random_state.randint(0, hash_size, num_hash)
+    A.setflags(write=False)
+    B.setflags(write=False)
 
-    # Generate hash functions;
-    # Note we need to do this to clarify the scope of the lambda function:
-    # https://stackoverflow.com/a/34021333
-    return [(lambda y, z: (lambda x: (y*x + z) % (hash_size - 1)))(a, b)
-            for a, b in zip(A, B)]
+    return A, B, hash_size
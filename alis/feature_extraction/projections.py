@@ -0,0 +1,113 @@
+"""
+Functions for extracting random projection signatures given dense or
+sparse vectors.
+"""
+
+import numpy as np
+from scipy import sparse
+
+from .minhash import pack_bits
+
+# Maximum number of rows projected at once
+_BATCH_SIZE = 2**14
+
+
+def random_hyperplanes(n_features, num_bits, seed=1337):
+    """Return the normal vectors of `num_bits` random hyperplanes
+
+    Parameters
+    ----------
+    n_features : int
+        Dimension of the vectors to be projected
+    num_bits : int
+        Number of hyperplanes
+    seed : int, default=1337
+        Random seed to use during random number generation
+
+    Returns
+    -------
+    planes : array of shape (n_features, num_bits)
+        Standard normal entries
+    """
+    return np.random.RandomState(seed).standard_normal((n_features, num_bits))
+
+
+def _project(X, planes):
+    """Yield the row slices of X along with their projections"""
+    for lo in range(0, X.shape[0], _BATCH_SIZE):
+        hi = min(lo + _BATCH_SIZE, X.shape[0])
+        yield lo, hi, np.asarray(X[lo:hi] @ planes)
+
+
+def simhash_signatures(X, num_bits, seed=1337, packed=True):
+    """Return the random hyperplane (SimHash) signatures of the rows
+    of `X`
+
+    Bit j of a row is set when the row lies on the positive side of the
+    j-th random hyperplane. Two rows at angle theta agree on a bit with
+    probability 1 - theta / pi, so the fraction of equal bits estimates
+    their angular (cosine) similarity.
+
+    Parameters
+    ----------
+    X : array or scipy.sparse matrix of shape (n_docs, n_features)
+        Vectors to be hashed, e.g., embeddings or rating vectors
+    num_bits : int
+        Number of bits (hyperplanes) per signature
+    seed : int, default=1337
+        Random seed of the hyperplanes
+    packed : bool, default=True
+        If True, pack the bits into uint64 words with `pack_bits`, ready
+        for `hamming_distance`. If False, return one uint8 bit per
+        column, which can be banded by `LSH` with the numpy backend.
+
+    Returns
+    -------
+    signatures : uint64 array of shape (n_docs, ceil(num_bits / 64)) or
+    uint8 array of shape (n_docs, num_bits)
+        Sign bits of each row
+    """
+    if not sparse.issparse(X):
+        X = np.asarray(X, dtype=np.float64)
+    planes = random_hyperplanes(X.shape[1], num_bits, seed)
+    bits = np.empty((X.shape[0], num_bits), dtype=np.uint8)
+    for lo, hi, projection in _project(X, planes):
+        bits[lo:hi] = projection > 0
+    return pack_bits(bits, 1) if packed else bits
+
+
+def pstable_signatures(X, num_hash, w, seed=1337):
+    """Return the p-stable (E2LSH) signatures of the rows of `X`
+
+    Value j of a row x is `floor((a_j . x + b_j) / w)`, where `a_j` has
+    standard normal entries and `b_j` is uniform in [0, w). Rows at
+    Euclidean distance c agree on a value with a probability that only
+    depends on w / c (see `pstable_collision_prob`), so the signatures
+    can be banded by `LSH` with the numpy backend to find near
+    neighbours in L2 distance.
+
+    Parameters
+    ----------
+    X : array or scipy.sparse matrix of shape (n_docs, n_features)
+        Points to be hashed
+    num_hash : int
+        Number of projections per signature
+    w : float
+        Bucket width of the projections. See `optimal_pstable_bands`.
+    seed : int, default=1337
+        Random seed of the projections and offsets
+
+    Returns
+    -------
+    signatures : int64 array of shape (n_docs, num_hash)
+        Bucket index of each projection of each row
+    """
+    if not sparse.issparse(X):
+        X = np.asarray(X, dtype=np.float64)
+    planes = random_hyperplanes(X.shape[1], num_hash, seed)
+    # Offsets are drawn as fractions of w so that they do not depend on w
+    offsets = np.random.RandomState(seed + 1).random_sample(num_hash)
+    signatures = np.empty((X.shape[0], num_hash), dtype=np.int64)
+    for lo, hi, projection in _project(X, planes):
+        signatures[lo:hi] = np.floor(projection / w + offsets)
+    return signatures
@@ -3,12 +3,13 @@ Functions for extracting different types of
 shingles given a text.
 """
 
-import hashlib
-
+import numpy as np
 from sklearn.feature_extraction.text import ENGLISH_STOP_WORDS
 
+from ._hashing import fmix64, hash_texts, rolling_hash, sorted_unique
+
 
-def hash_function(text, n):
+def hash_function(text, n, hash_method='sha1', seed=0):
     """Return the integer hash function representation given text and
     the number of buckets n
 
@@ -18,13 +19,20 @@ def hash_function(text, n):
         String of text whose hash representation is to be computed
     n : int
         The number definining the bucket size: 2**n - 1
+    hash_method : str or callable, default='sha1'
+        Hash function to use: `'sha1'`, or one of the non-cryptographic
+        `'crc32'`, `'murmur3'` and `'fnv1a'`. Only `'crc32'` is faster
+        than `'sha1'` on a single document; `'murmur3'` and `'fnv1a'`
+        are vectorized and pay off when hashing large batches.
+    seed : int, default=0
+        Seed of the hash function. Ignored by `'sha1'`.
 
     Returns
     -------
     hashed_int : int
         Hashed representation of the given text
     """
-    return int(hashlib.sha1(text.encode('utf-8')).hexdigest(), 16) % (2**n - 1)
+    return hash_texts([text], n, hash_method, seed)[0]
 
 
 def k_shingles(text, k):
@@ -45,7 +53,7 @@ def k_shingles(text, k):
     return set([text[i:i+k] for i in range(0, len(text) - k + 1)])
 
 
-def hashed_shingles(text, k, n):
+def hashed_shingles(text, k, n, hash_method='sha1', seed=0):
     """Return all the `k`-shingles in the given `text` hashed into a
     bucket number in the range 0 to 2**`n` - 1
 
@@ -57,6 +65,13 @@ def hashed_shingles(text, k, n):
         Shingle size
     n : int
         The number defining the bucket size 2**n - 1
+    hash_method : str or callable, default='sha1'
+        Hash function to use: `'sha1'`, or one of the non-cryptographic
+        `'crc32'`, `'murmur3'` and `'fnv1a'`. Only `'crc32'` is faster
+        than `'sha1'` on a single document; `'murmur3'` and `'fnv1a'`
+        are vectorized and pay off when hashing large batches.
+    seed : int, default=0
+        Seed of the hash function. Ignored by `'sha1'`.
 
     Returns
     -------
@@ -64,9 +79,40 @@ def hashed_shingles(text, k, n):
         An iterable of all k-shingles in the input text hashed into
         buckets
     """
-    return set([
-        hash_function(text[i:i+k], n)
-        for i in range(0, len(text) - k + 1)])
+    return set(hash_texts(list(k_shingles(text, k)), n, hash_method, seed))
+
+
+def rolling_shingles(text, k, n=None, seed=0):
+    """Return the distinct `k`-shingles of the given `text` as an array of
+    hashed shingle ids
+
+    Unlike `hashed_shingles`, no substring is created: the hashes of all
+    `k`-character windows are computed at once over the code points of
+    the text using a rolling (Rabin-Karp) polynomial hash. The result can
+    be passed directly to `get_signatures`.
+
+    Parameters
+    ----------
+    text : str
+        String of text in which shingles are to be extracted
+    k : int
+        Shingle size
+    n : int, default=None
+        The number defining the bucket size 2**n - 1. If not specified,
+        the full 64-bit hashes are returned.
+    seed : int, default=0
+        Seed of the rolling hash function
+
+    Returns
+    -------
+    shingles : uint64 array
+        Sorted array of the distinct hashed k-shingles in the input text
+    """
+    codes = np.frombuffer(text.encode('utf-32-le'), dtype='<u4')
+    hashes = rolling_hash(codes, k, seed)
+    if n is not None:
+        hashes = hashes % np.uint64(2**n - 1)
+    return sorted_unique(hashes)
 
 
 def word_shingles(text, k, stop_words=None):
@@ -103,7 +149,8 @@ def word_shingles(text, k, stop_words=None):
     ])
 
 
-def hashed_word_shingles(text, k, n, stop_words=None):
+def hashed_word_shingles(text, k, n, stop_words=None, hash_method='sha1',
+                         seed=0):
     """Return the list of word `k`-shingles from the given text based
     on a given stop words then hases it into a bucket with range 0 to
     2**n - 1.
@@ -122,6 +169,13 @@ def hashed_word_shingles(text, k, n, stop_words=None):
     stop_words : iterabe of str, default=None
         List of stop words to be used. By default, uses the English
         stopwords defined by sklearn
+    hash_method : str or callable, default='sha1'
+        Hash function to use: `'sha1'`, or one of the non-cryptographic
+        `'crc32'`, `'murmur3'` and `'fnv1a'`. Only `'crc32'` is faster
+        than `'sha1'` on a single document; `'murmur3'` and `'fnv1a'`
+        are vectorized and pay off when hashing large batches.
+    seed : int, default=0
+        Seed of the hash function. Ignored by `'sha1'`.
 
     Returns
     -------
@@ -129,13 +183,129 @@ def hashed_word_shingles(text, k, n, stop_words=None):
         A list containing the extracted word shingles in hashed
         representation.
     """
-    # Define stop words if none is given
-    if stop_words is None:
-        stop_words = ENGLISH_STOP_WORDS
-    splitted_text = text.split()
+    return set(hash_texts(
+        list(word_shingles(text, k, stop_words)), n, hash_method, seed))
 
-    return set([
-        hash_function(' '.join(splitted_text[i:i + k]), n)
-        for i in range(len(splitted_text) - k + 1)
-        if splitted_text[i] in stop_words
-    ])
+
+class WordShingler:
+    """Word `k`-shingle extractor backed by a reusable vocabulary.
+
+    Produces the same shingles as `word_shingles`, i.e., a stop word
+    followed by the next `k-1` words, but never joins them into strings.
+    Each distinct token is hashed once and stored in the vocabulary
+    along with whether it is a stop word. A document is then mapped to
+    token indices, its stop-word anchors are found with a vectorized
+    mask, and the `k` token hashes of each shingle are combined
+    arithmetically into a single shingle id.
+
+    The shingle ids differ from those of `hashed_word_shingles`, but
+    since both map each distinct shingle to a single id, the resulting
+    sets agree in size and Jaccard similarity up to hash collisions.
+
+    Attributes
+    ----------
+    k : int
+        Shingle size
+    n : int
+        The number defining the bucket size 2**n - 1. If None, the full
+        64-bit shingle ids are returned.
+    stop_words : iterable of str
+        List of stop words used as shingle anchors
+    hash_method : str or callable
+        Hash function used to hash each token
+    seed : int
+        Seed of the token and shingle hash functions
+    vocabulary_ : dict
+        Mapping of each token seen so far to its index
+    """
+
+    def __init__(self, k, n=None, stop_words=None, hash_method='crc32',
+                 seed=0):
+        """Initialize the word shingler
+
+        Parameters
+        ----------
+        k : int
+            Shingle size
+        n : int, default=None
+            The number defining the bucket size 2**n - 1. If not
+            specified, the full 64-bit shingle ids are returned.
+        stop_words : iterable of str, default=None
+            List of stop words to be used. By default, uses the English
+            stopwords defined by sklearn
+        hash_method : str or callable, default='crc32'
+            Hash function used to hash each token: `'sha1'`, `'crc32'`,
+            `'murmur3'` or `'fnv1a'`. New tokens are hashed in small
+            batches, where `'crc32'` is the fastest. Its 32-bit token
+            hashes only collide about once per 100,000 distinct tokens;
+            `'sha1'` gives 64-bit token hashes.
+        seed : int, default=0
+            Seed of the token and shingle hash functions
+        """
+        self.k = k
+        self.n = n
+        self.stop_words = (ENGLISH_STOP_WORDS if stop_words is None
+                           else frozenset(stop_words))
+        self.hash_method = hash_method
+        self.seed = seed
+        self.vocabulary_ = {}
+        self._token_hashes = np.empty(16, dtype=np.uint64)
+        self._is_stop_word = np.empty(16, dtype=bool)
+        # Odd multiplier used to combine the token hashes of a shingle
+        self._base = np.uint64(
+            int(fmix64(np.array([seed + 1], dtype=np.uint64))[0]) | 1)
+
+    def _add_tokens(self, tokens):
+        """Add the given new tokens to the vocabulary"""
+        start = len(self.vocabulary_)
+        stop = start + len(tokens)
+        if stop > len(self._token_hashes):
+            capacity = max(stop, 2 * len(self._token_hashes))
+            self._token_hashes = np.resize(self._token_hashes, capacity)
+            self._is_stop_word = np.resize(self._is_stop_word, capacity)
+
+        hashes = hash_texts(tokens, 64, self.hash_method, self.seed)
+        self._token_hashes[start:stop] = hashes
+        self._is_stop_word[start:stop] = [
+            token in self.stop_words for token in tokens]
+        self.vocabulary_.update(zip(tokens, range(start, stop)))
+
+    def transform(self, text):
+        """Return the distinct hashed word `k`-shingles of `text`
+
+        Parameters
+        ----------
+        text : str
+            String of text whose word shingles are to be extracted
+
+        Returns
+        -------
+        shingles : uint64 array
+            Sorted array of the distinct hashed word shingles in the
+            input text
+        """
+        tokens = text.split()
+        vocabulary = self.vocabulary_
+        try:
+            token_ids = np.fromiter(map(vocabulary.__getitem__, tokens),
+                                    dtype=np.int64, count=len(tokens))
+        except KeyError:
+            self._add_tokens([token for token in dict.fromkeys(tokens)
+                              if token not in vocabulary])
+            token_ids = np.fromiter(map(vocabulary.__getitem__, tokens),
+                                    dtype=np.int64, count=len(tokens))
+        n_windows = len(tokens) - self.k + 1
+        if n_windows <= 0:
+            return np.empty(0, dtype=np.uint64)
+
+        anchors = np.flatnonzero(self._is_stop_word[token_ids[:n_windows]])
+        token_hashes = self._token_hashes[token_ids]
+        shingles = np.zeros(len(anchors), dtype=np.uint64)
+        for j in range(self.k):
+            shingles = shingles * self._base + token_hashes[anchors + j]
+        shingles = fmix64(shingles)
+        if self.n is not None:
+            shingles = shingles % np.uint64(2**self.n - 1)
+        return sorted_unique(shingles)
+
+    __call__ = transform
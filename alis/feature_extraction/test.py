@@ -0,0 +1,400 @@
+import threading
+import unittest
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+import dask
+import dask.bag as db
+import numpy as np
+from numpy.testing import assert_array_equal
+from scipy import sparse
+from alis.feature_extraction import *
+from alis.feature_extraction._hashing import HASH_METHODS, fmix64, hash_texts
+from alis.feature_extraction.minhash._base import _densify
+from alis.feature_extraction.minhash.hash_functions import (
+    create_hash_functions, hash_parameters)
+
+TEXT = ('the quick brown fox jumps over the lazy dog and the cat sat on '
+        'a mat in the house of the old man by the river')
+
+
+class HashingTests(unittest.TestCase):
+
+    def test_murmur3(self):
+        # published MurmurHash3_x86_32 test vectors
+        vectors = [
+            (b'', 0, 0),
+            (b'', 1, 0x514e28b7),
+            (b'', 0xffffffff, 0x81f16f39),
+            (b'\0\0\0\0', 0, 0x2362f9de),
+            (b'aaaa', 0x9747b28c, 0x5a97808a),
+            (b'aaa', 0x9747b28c, 0x283e0130),
+            (b'aa', 0x9747b28c, 0x5d211726),
+            (b'a', 0x9747b28c, 0x7fa09ea6),
+            (b'abcd', 0x9747b28c, 0xf0478627),
+            (b'abc', 0x9747b28c, 0xc84a62dd),
+            (b'ab', 0x9747b28c, 0x74875592),
+            (b'Hello, world!', 0x9747b28c, 0x24884cba),
+            (b'The quick brown fox jumps over the lazy dog', 0x9747b28c,
+             0x2fa826cd),
+            (b'The quick brown fox jumps over the lazy dog', 0, 0x2e4ff723),
+        ]
+        murmur3 = HASH_METHODS['murmur3']
+        for key, seed, expected in vectors:
+            self.assertEqual(int(murmur3([key], seed)[0]), expected)
+        # keys of different lengths hashed together
+        keys = [key for key, seed, _ in vectors if seed == 0x9747b28c]
+        assert_array_equal(
+            murmur3(keys, 0x9747b28c),
+            [expected for _, seed, expected in vectors if seed == 0x9747b28c])
+
+    def test_fnv1a(self):
+        fnv1a = HASH_METHODS['fnv1a']
+        # standard FNV-1a 64 vectors for the unseeded offset basis
+        assert_array_equal(fnv1a([b'', b'a', b'foobar']),
+                           [0xcbf29ce484222325, 0xaf63dc4c8601ec8c,
+                            0x85944171f73967e8])
+        keys = [b'a', b'ab', b'abc', b'abcd', b'hello world']
+        assert_array_equal(fnv1a(keys, 1), [
+            0x27a40fb23259f6a3, 0xb5bd6ccb8ede49f3, 0xaf296de3c3b6ffb0,
+            0x5a658e058ff4b53c, 0x2ac2e7b61ca1d00c])
+        assert_array_equal(fnv1a(keys, 42), [
+            0x04740d2b7efa43c2, 0x8b7600e8c340e8e0, 0x3a6c0e83c74b1699,
+            0x90b3a6eba4980fe7, 0x45bba6da1e68a825])
+
+    def test_hash_texts(self):
+        texts = ['a', 'ab', 'abc', 'the quick brown fox']
+        self.assertEqual(hash_texts(texts, 32, 'crc32', seed=3),
+                         [zlib.crc32(t.encode(), 3) % (2**32 - 1)
+                          for t in texts])
+        for hash_method in HASH_METHODS:
+            hashed = hash_texts(texts, 8, hash_method)
+            self.assertEqual(len(hashed), 4)
+            self.assertTrue(all(0 <= h < 2**8 - 1 for h in hashed))
+        with self.assertRaises(ValueError):
+            hash_texts(texts, 8, 'md5')
+
+
+class HashParameterTests(unittest.TestCase):
+
+    def test_pinned_coefficients(self):
+        # coefficients drawn by `np.random.seed(seed)` before memoization
+        A, B, hash_size = hash_parameters(4)
+        self.assertEqual(hash_size, 2**32)
+        self.assertEqual(A.tolist(),
+                         [1125387415, 2407456957, 681542492, 913057000])
+        self.assertEqual(B.tolist(),
+                         [1194544295, 2332513753, 1972751015, 145906010])
+        A, B, _ = hash_parameters(4, seed=7)
+        self.assertEqual(A.tolist(),
+                         [327741615, 976413892, 3349725721, 1369975286])
+        self.assertEqual(B.tolist(),
+                         [1882953283, 4201435347, 3107259287, 1956722279])
+        A, B, _ = hash_parameters(3, 2**16)
+        self.assertEqual((A.tolist(), B.tolist()),
+                         ([3223, 57533, 33628], [9448, 19623, 21977]))
+        with self.assertRaises(ValueError):
+            A[0] = 0
+
+        hash_functions = create_hash_functions(4)
+        self.assertEqual([h(5) for h in hash_functions],
+                         [(a * 5 + b) % (2**32 - 1) for a, b in zip(
+                             [1125387415, 2407456957, 681542492, 913057000],
+                             [1194544295, 2332513753, 1972751015, 145906010])])
+
+    def test_global_random_state(self):
+        np.random.seed(0)
+        state = np.random.get_state()
+        # uncached parameters are drawn without touching the global state
+        hash_parameters(5, seed=424242)
+        create_hash_functions(6, 2**20, seed=424243)
+        after = np.random.get_state()
+        self.assertEqual(after[0], state[0])
+        assert_array_equal(after[1], state[1])
+        self.assertEqual(after[2:], state[2:])
+
+
+class SignatureTests(unittest.TestCase):
+
+    def test_parity_with_hash_functions(self):
+        hash_functions = create_hash_functions(32)
+        for n in [8, 16, 24, 31]:
+            shingles = hashed_word_shingles(TEXT, 3, n)
+            expected = [min(h(x) for x in shingles) for h in hash_functions]
+            self.assertEqual(get_signature(shingles, 32), expected)
+
+    def test_batch(self):
+        documents = [hashed_word_shingles(TEXT, k, 31) for k in [2, 3, 4]]
+        signatures = get_signatures(documents, 16)
+        self.assertEqual(signatures.shape, (3, 16))
+        for doc, signature in zip(documents, signatures):
+            self.assertEqual(get_signature(doc, 16), signature.tolist())
+
+
+class OnePermutationTests(unittest.TestCase):
+
+    def test_densification(self):
+        documents = [hashed_word_shingles(TEXT, 3, 31), {7}]
+        signatures = get_signatures(documents, 64, method='one_permutation')
+        self.assertEqual(signatures.shape, (2, 64))
+        # every bin is filled by densification, even for a single shingle
+        self.assertTrue(np.all(signatures < 2**32 - 1))
+        self.assertEqual(len(set(signatures[1].tolist())), 1)
+        again = get_signatures(documents[:1], 64, method='one_permutation')
+        assert_array_equal(again[0], signatures[0])
+
+    def test_probe_sequence(self):
+        # rows with a single filled bin need more probes than the initial
+        # table of `_probe_shifts` holds
+        rng = np.random.default_rng(0)
+        num_hash, seed = 256, 5
+        filled = rng.random((20, num_hash)) < 0.3
+        filled[:5] = False
+        filled[np.arange(5), rng.integers(num_hash, size=5)] = True
+        signature = rng.integers(2**32, size=(20, num_hash), dtype=np.uint64)
+        expected = signature.copy()
+        salt = np.uint64((0x9e3779b97f4a7c15 * (seed + 1)) % 2**64)
+        for row, col in zip(*np.nonzero(~filled)):
+            attempt = 0
+            while True:
+                probe = np.uint64((int(col) << 32) | attempt) ^ salt
+                candidate = int(fmix64(np.array([probe]))[0] % num_hash)
+                if filled[row, candidate]:
+                    break
+                attempt += 1
+            expected[row, col] = signature[row, candidate]
+        assert_array_equal(_densify(signature, filled, seed), expected)
+
+
+class ShingleTests(unittest.TestCase):
+
+    def test_rolling_shingles(self):
+        for k in [1, 3, 5]:
+            shingles = rolling_shingles(TEXT, k)
+            self.assertEqual(len(shingles), len(k_shingles(TEXT, k)))
+            self.assertTrue(np.all(np.diff(shingles.astype(np.float64)) > 0))
+        self.assertEqual(len(rolling_shingles('abcab', 2)), 3)
+        self.assertTrue(np.all(rolling_shingles(TEXT, 3, n=16) < 2**16 - 1))
+
+    def test_word_shingler(self):
+        texts = [TEXT, TEXT.replace('fox', 'cat'),
+                 'the man and the dog sat in the house by the river']
+        shingler = WordShingler(3)
+        shingles = [shingler.transform(text) for text in texts]
+        expected = [hashed_word_shingles(text, 3, 63) for text in texts]
+        for doc, hashed in zip(shingles, expected):
+            self.assertEqual(len(doc), len(hashed))
+        for i in range(3):
+            for j in range(i + 1, 3):
+                first, second = set(shingles[i]), set(shingles[j])
+                self.assertEqual(
+                    len(first & second) / len(first | second),
+                    len(expected[i] & expected[j])
+                    / len(expected[i] | expected[j]))
+
+        # the vocabulary is reused across documents and calls
+        self.assertEqual(set(shingler.vocabulary_),
+                         set(' '.join(texts).split()))
+        vocabulary = dict(shingler.vocabulary_)
+        assert_array_equal(shingler(texts[1]), shingles[1])
+        self.assertEqual(shingler.vocabulary_, vocabulary)
+        assert_array_equal(WordShingler(3).transform(texts[1]), shingles[1])
+
+    def test_word_shingler_edge_cases(self):
+        shingler = WordShingler(4, n=20)
+        self.assertEqual(len(shingler.transform('')), 0)
+        self.assertEqual(len(shingler.transform('the lazy dog')), 0)
+        self.assertEqual(len(shingler.transform('the lazy dog sat')), 1)
+        self.assertTrue(np.all(shingler.transform(TEXT) < 2**20 - 1))
+
+        shingler = WordShingler(2, stop_words=['fox', 'cat'])
+        shingles = shingler.transform(TEXT)
+        self.assertEqual(
+            len(shingles), len(word_shingles(TEXT, 2, ['fox', 'cat'])))
+        self.assertEqual(len(shingles), 2)
+
+
+class BbitTests(unittest.TestCase):
+
+    def test_round_trip(self):
+        rng = np.random.default_rng(0)
+        signatures = rng.integers(0, 2**32, size=(5, 70), dtype=np.uint64)
+        for num_bits in [1, 2, 4, 8]:
+            for dtype in [np.uint64, np.uint8]:
+                packed = pack_bits(signatures, num_bits, dtype)
+                self.assertEqual(packed.dtype, dtype)
+                per_word = np.dtype(dtype).itemsize * 8 // num_bits
+                self.assertEqual(packed.shape, (5, -(-70 // per_word)))
+                assert_array_equal(unpack_bits(packed, num_bits, 70),
+                                   signatures % 2**num_bits)
+        with self.assertRaises(ValueError):
+            pack_bits(signatures, 3)
+
+
+class WeightedSignatureTests(unittest.TestCase):
+
+    def test_generalized_jaccard(self):
+        rng = np.random.default_rng(0)
+        X = rng.exponential(size=(2, 50))
+        X[1] = X[0] * rng.uniform(0.5, 1.5, size=50)
+        X[:, :10] = 0
+        expected = np.minimum(X[0], X[1]).sum() / np.maximum(X[0], X[1]).sum()
+        signatures = get_weighted_signatures(X, 2000)
+        estimate = (signatures[0] == signatures[1]).mean()
+        self.assertAlmostEqual(estimate, expected, delta=0.05)
+
+        same = get_weighted_signatures(X[[0, 0]], 64)
+        assert_array_equal(same[0], same[1])
+        with self.assertRaises(ValueError):
+            get_weighted_signatures(-X, 8)
+
+
+class SimHashTests(unittest.TestCase):
+
+    def test_sparse_input(self):
+        X = sparse.random(30, 50, density=0.2, format='csr', random_state=0)
+        X.data -= 0.5
+        for packed in [True, False]:
+            assert_array_equal(
+                simhash_signatures(X, 100, packed=packed),
+                simhash_signatures(X.toarray(), 100, packed=packed))
+
+    def test_packed(self):
+        X = np.random.default_rng(0).standard_normal((30, 20))
+        bits = simhash_signatures(X, 100, packed=False)
+        self.assertEqual((bits.shape, bits.dtype), ((30, 100), np.uint8))
+        self.assertTrue(np.all(bits <= 1))
+        packed = simhash_signatures(X, 100)
+        self.assertEqual((packed.shape, packed.dtype), ((30, 2), np.uint64))
+        assert_array_equal(packed, pack_bits(bits, 1))
+        self.assertFalse(np.array_equal(simhash_signatures(X, 100, seed=1),
+                                        packed))
+
+
+class PStableTests(unittest.TestCase):
+
+    def test_sparse_input(self):
+        X = sparse.random(30, 50, density=0.2, format='csr', random_state=0)
+        signatures = pstable_signatures(X, 16, 0.5)
+        self.assertEqual(signatures.dtype, np.int64)
+        assert_array_equal(signatures,
+                           pstable_signatures(X.toarray(), 16, 0.5))
+        self.assertTrue(np.any(signatures < 0))
+
+    def test_width(self):
+        X = np.random.default_rng(0).standard_normal((30, 20))
+        narrow = pstable_signatures(X, 16, 1.0)
+        wide = pstable_signatures(X, 16, 4.0)
+        self.assertLess(len(set(wide[:, 0].tolist())),
+                        len(set(narrow[:, 0].tolist())))
+
+
+class _CountingExecutor(ThreadPoolExecutor):
+    """Thread pool recording the largest number of unfinished tasks"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.lock = threading.Lock()
+        self.pending = self.max_pending = 0
+
+    def submit(self, fn, *args, **kwargs):
+        with self.lock:
+            self.pending += 1
+            self.max_pending = max(self.max_pending, self.pending)
+        future = super().submit(fn, *args, **kwargs)
+        future.add_done_callback(self._done)
+        return future
+
+    def _done(self, future):
+        with self.lock:
+            self.pending -= 1
+
+
+class TransformMatrixTests(unittest.TestCase):
+
+    def setUp(self):
+        words = TEXT.split()
+        self.texts = [(i, ' '.join(words[i % 7:] + words[:i % 7]))
+                      for i in range(50)]
+        self.extractor = MinhashLSH(3, 31, 16)
+        self.expected = self.extractor.transform_matrix(
+            self.texts, backend='serial', chunk_size=4)
+
+    def test_dask_transforms_agree(self):
+        texts = self.texts + [(50, ''), (51, '   ')]
+        for method in ['minhash', 'one_permutation']:
+            extractor = MinhashLSH(3, 31, 16, method=method)
+            expected = get_signatures(
+                [hashed_word_shingles(text, 3, 31) for _, text in self.texts],
+                16, method=method)
+            with dask.config.set(scheduler='synchronous'):
+                bag = db.from_sequence(texts, npartitions=4)
+                rows = extractor.transform(bag).compute()
+                blocks = extractor.transform_partitions(bag).compute()
+                matrix = extractor.transform_matrix(bag, backend='dask')
+            self.assertEqual(len(blocks), 4)
+            # documents without any shingle are dropped by every path
+            self.assertEqual([doc_id for doc_id, _ in rows], list(range(50)))
+            assert_array_equal(np.vstack([row for _, row in rows]), expected)
+            assert_array_equal(
+                np.concatenate([ids for ids, _ in blocks]), np.arange(50))
+            assert_array_equal(
+                np.vstack([sig for _, sig in blocks]), expected)
+            assert_array_equal(matrix[0], np.arange(50))
+            assert_array_equal(matrix[1], expected)
+            serial = extractor.transform_matrix(texts, backend='serial')
+            assert_array_equal(serial[1], expected)
+
+    def test_executor_factory(self):
+        ids, signatures = self.extractor.transform_matrix(
+            self.texts, n_jobs=2, chunk_size=4, executor=ThreadPoolExecutor)
+        assert_array_equal(ids, self.expected[0])
+        assert_array_equal(signatures, self.expected[1])
+
+    def test_executor_instance(self):
+        with _CountingExecutor(max_workers=2) as executor:
+            ids, signatures = self.extractor.transform_matrix(
+                self.texts, chunk_size=4, executor=executor, max_pending=3)
+            self.assertLessEqual(executor.max_pending, 3)
+        assert_array_equal(ids, self.expected[0])
+        assert_array_equal(signatures, self.expected[1])
+        with self.assertRaises(ValueError):
+            self.extractor.transform_matrix(self.texts, max_pending=0)
+
+    def test_concurrent_calls(self):
+        extractors = [self.extractor, MinhashLSH(3, 31, 16, seed=7)]
+        expected = [extractor.transform_matrix(self.texts, backend='serial')
+                    for extractor in extractors]
+        results = [None, None]
+        barrier = threading.Barrier(2)
+
+        def run(i):
+            barrier.wait()
+            results[i] = extractors[i].transform_matrix(
+                self.texts, n_jobs=2, chunk_size=2,
+                executor=ThreadPoolExecutor)
+
+        for _ in range(5):
+            threads = [threading.Thread(target=run, args=(i,))
+                       for i in range(2)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            for result, (ids, signatures) in zip(results, expected):
+                assert_array_equal(result[0], ids)
+                assert_array_equal(result[1], signatures)
+
+    def test_empty(self):
+        for hash_size, dtype in [(None, np.uint32), (2**40, np.uint64)]:
+            extractor = MinhashLSH(3, 31, 16, hash_size=hash_size)
+            for backend in ['serial', 'process']:
+                ids, signatures = extractor.transform_matrix(
+                    [(0, 'quick brown fox')], backend=backend)
+                self.assertEqual(ids.shape, (0,))
+                self.assertEqual(ids.dtype, object)
+                self.assertEqual(signatures.shape, (0, 16))
+                self.assertEqual(signatures.dtype, dtype)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -2,9 +2,19 @@
 Functions helpful for link analysis of datasets.
 """
 
+import gzip
+from itertools import islice
 
 import numpy as np
 import networkx as nx
+import scipy.sparse as sp
+from scipy.linalg import solve_triangular
+from scipy.sparse.linalg import splu
+
+PAGE_RANK_METHODS = ('power', 'gauss_seidel', 'extrapolation', 'adaptive')
+
+# number of power iterations between two extrapolations
+_EXTRAPOLATION_PERIOD = 10
 
 
 def idealized_page_rank(M, tol=10**-6, max_iter=100):
@@ -40,7 +50,231 @@ def idealized_page_rank(M, tol=10**-6, max_iter=100):
     return v
 
 
-def transition_matrix(G):
+def _sparse_transition_matrix(src, dst, n, weights=None):
+    """
+    Build a column-stochastic sparse transition matrix from an edge list
+
+    Parameters
+    ----------
+    src : numpy array
+        Source node index of each edge
+    dst : numpy array
+        Destination node index of each edge
+    n : integer
+        Number of nodes in the network
+    weights : numpy array, default=None
+        Weight of each edge. If None, every edge has a weight of 1.
+
+    Returns
+    -------
+    M : scipy.sparse.csr_matrix
+        Transition Matrix of shape (n, n) whose column j spreads the
+        PageRank of node j over its out-links proportionally to their
+        weights
+    dangling : numpy array
+        Indices of the nodes without out-links, whose columns are zero
+    """
+    src = np.asarray(src)
+    dst = np.asarray(dst)
+    if weights is None:
+        weights = np.ones(len(src))
+    weights = np.asarray(weights, dtype=float)
+
+    out_weight = np.bincount(src, weights=weights, minlength=n)
+    dangling = np.flatnonzero(out_weight == 0)
+    # dangling nodes have no edges, so the placeholder is never used
+    out_weight[dangling] = 1
+
+    M = sp.csr_matrix((weights / out_weight[src], (dst, src)), shape=(n, n))
+    M.sum_duplicates()
+    return M, dangling
+
+
+class _NodeIndex:
+    """Map node labels to consecutive integer ids in order of first
+    appearance
+
+    The known labels are kept in sorted runs whose sizes at least halve from
+    one run to the next. A new run is merged with the previous one while it
+    is at least half its size, so each label takes part in O(log nodes)
+    merges instead of the whole index being rebuilt for every chunk.
+    """
+
+    def __init__(self, dtype):
+        self.dtype = dtype
+        self.runs = []  # (sorted labels, id of each label) pairs
+        self.labels = []  # label arrays in order of id
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    def _find(self, unique):
+        """Return the ids of the sorted unique labels, -1 if unknown"""
+        ids = np.full(len(unique), -1, dtype=np.int64)
+        for keys, key_ids in self.runs:
+            pos = np.minimum(np.searchsorted(keys, unique), len(keys) - 1)
+            hit = keys[pos] == unique
+            ids[hit] = key_ids[pos[hit]]
+        return ids
+
+    def _add_run(self, keys, key_ids):
+        """Add sorted labels and their ids, merging the smaller runs"""
+        self.runs.append((keys, key_ids))
+        while (len(self.runs) > 1
+               and 2*len(self.runs[-1][0]) >= len(self.runs[-2][0])):
+            keys2, ids2 = self.runs.pop()
+            keys1, ids1 = self.runs.pop()
+            # concatenate widens string labels to the longest one
+            keys = np.concatenate([keys1, keys2])
+            key_ids = np.concatenate([ids1, ids2])
+            order = np.argsort(keys, kind='stable')
+            self.runs.append((keys[order], key_ids[order]))
+
+    def map(self, labels):
+        """Return the ids of the given labels, adding the new ones"""
+        order = np.argsort(labels, kind='stable')
+        ordered = labels[order]
+        first = np.ones(len(labels), dtype=bool)
+        first[1:] = ordered[1:] != ordered[:-1]
+        unique = ordered[first]
+        inverse = np.empty(len(labels), dtype=np.int64)
+        inverse[order] = np.cumsum(first) - 1
+
+        unique_ids = self._find(unique)
+        found = unique_ids >= 0
+        new = unique[~found]
+        if len(new):
+            # number the new labels by first appearance in the chunk
+            first_seen = np.full(len(unique), len(labels))
+            np.minimum.at(first_seen, inverse, np.arange(len(labels)))
+            new_order = np.argsort(first_seen[~found], kind='stable')
+            new_ids = np.empty(len(new), dtype=np.int64)
+            new_ids[new_order] = self.size + np.arange(len(new))
+            unique_ids[~found] = new_ids
+            self.labels.append(new[new_order])
+            self.size += len(new)
+            self._add_run(new, new_ids)
+        return unique_ids[inverse]
+
+    def nodes(self):
+        """Return the labels ordered by id"""
+        if not self.labels:
+            return np.empty(0, dtype=self.dtype)
+        return np.concatenate(self.labels)
+
+
+def read_edge_list(path, delimiter=None, src_col=0, dst_col=1,
+                   weight_col=None, label_dtype=np.int64, comments='#',
+                   skiprows=0, chunk_size=2**20):
+    """
+    Read an edge list file in chunks into compact source/destination arrays
+
+    Parameters
+    ----------
+    path : str
+        Path of a CSV/TSV file with one edge per line. Files ending in .gz
+        are decompressed on the fly.
+    delimiter : str
+        Column delimiter. If None, a tab for .tsv files and a comma
+        otherwise.
+    src_col : integer
+        Column of the source node labels
+    dst_col : integer
+        Column of the destination node labels
+    weight_col : integer
+        Column of the edge weights. Edges with a zero weight are dropped,
+        along with the nodes that only appear in such edges.
+        If None, the edges are unweighted.
+    label_dtype : numpy dtype
+        Dtype of the node labels, e.g. str for non-numeric labels
+    comments : str
+        Lines starting with this string are ignored
+    skiprows : integer
+        Number of lines to skip at the start of the file, e.g. a header
+    chunk_size : integer
+        Number of lines parsed at once
+
+    Returns
+    -------
+    src, dst : numpy array
+        int32 node ids of the source and destination of each edge (int64
+        if there are more than 2**31 - 1 nodes)
+    weights : numpy array or None
+        float32 weight of each edge, or None if weight_col is None
+    nodes : numpy array
+        Label of each node id, in order of first appearance
+    """
+    if delimiter is None:
+        stem = path[:-3] if path.endswith('.gz') else path
+        delimiter = '\t' if stem.endswith('.tsv') else ','
+    opener = gzip.open if path.endswith('.gz') else open
+    usecols = [src_col, dst_col] + ([] if weight_col is None else [weight_col])
+
+    index = _NodeIndex(label_dtype)
+    src, dst, weights = [], [], []
+    with opener(path, 'rt') as f:
+        lines = islice(f, skiprows, None)
+        while True:
+            chunk = list(islice(lines, chunk_size))
+            if not chunk:
+                break
+            columns = np.loadtxt(chunk, delimiter=delimiter, usecols=usecols,
+                                 dtype=str, comments=comments, ndmin=2)
+            if len(columns) == 0:
+                continue
+            if weight_col is not None:
+                w = columns[:, 2].astype(np.float32)
+                columns = columns[w != 0]
+                weights.append(w[w != 0])
+            ids = index.map(columns[:, :2].astype(label_dtype).ravel())
+            if len(index) < 2**31:
+                ids = ids.astype(np.int32)
+            src.append(ids[0::2])
+            dst.append(ids[1::2])
+
+    id_dtype = np.int32 if len(index) < 2**31 else np.int64
+    src = np.concatenate(src) if src else np.empty(0, id_dtype)
+    dst = np.concatenate(dst) if dst else np.empty(0, id_dtype)
+    if weight_col is None:
+        weights = None
+    else:
+        weights = np.concatenate(weights) if weights else np.empty(0, np.float32)
+    return src, dst, weights, index.nodes()
+
+
+def load_transition_matrix(path, return_dangling=False, **kwargs):
+    """
+    Compute the sparse Transition Matrix of an edge list file without
+    building a NetworkX graph
+
+    Parameters
+    ----------
+    path : str
+        Path of the edge list file; see read_edge_list
+    return_dangling : bool
+        If True, also return the indices of the dangling nodes
+    **kwargs : keyword arguments passed to read_edge_list
+
+    Returns
+    -------
+    M : scipy.sparse.csr_matrix
+        Column-stochastic transition matrix, with out-links weighted by the
+        weight column if given
+    nodes : numpy array
+        Label of each row/column of M
+    dangling : numpy array
+        Indices of the dangling nodes; only returned if return_dangling
+        is True
+    """
+    src, dst, weights, nodes = read_edge_list(path, **kwargs)
+    M, dangling = _sparse_transition_matrix(src, dst, len(nodes), weights)
+    if return_dangling:
+        return M, nodes, dangling
+    return M, nodes
+
+
+def transition_matrix(G, sparse=False, return_dangling=False):
     """
     Compute the Transition Matrix given a NetworkX graph
 
@@ -48,24 +282,157 @@ def transition_matrix(G):
     ----------
     G : NetworkX graph
         Graph to extract the transition matrix
+    sparse : bool
+        If True, build a column-stochastic scipy.sparse CSR matrix directly
+        from the edge list of G, which needs O(edges) instead of O(n^2)
+        memory. Edge weights are ignored.
+    return_dangling : bool
+        If True, also return the indices of the dangling nodes (nodes
+        without out-links), whose columns in M are all zeros
 
     Returns
     -------
-    M : numpy array
-        Numpy array of the transition matrix of G
+    M : numpy array or scipy.sparse.csr_matrix
+        Transition matrix of G, with rows and columns in the order of
+        G.nodes
+    dangling : numpy array
+        Indices of the dangling nodes; only returned if return_dangling
+        is True
     """
+    if sparse:
+        index = {node: i for i, node in enumerate(G.nodes)}
+        edges = np.array([(index[u], index[v]) for u, v in G.edges()],
+                         dtype=np.int64).reshape(-1, 2)
+        M, dangling = _sparse_transition_matrix(
+            edges[:, 0], edges[:, 1], len(index))
+        if return_dangling:
+            return M, dangling
+        return M
+
     A = nx.adjacency_matrix(G).toarray()
     d = np.array([x[1] for x in list(G.out_degree)])
+    dangling = np.flatnonzero(d == 0)
 
     # get indices with zero and replace them with 1 to avoid division by zero
     # this won't affect the result since the corresponding column will have all zeros
     d[d == 0] = 1
 
     M = A.T * (1/d)
+    if return_dangling:
+        return M, dangling
     return M
 
 
-def taxed_page_rank(M, beta=0.8, tol=10**-6, max_iter=100):
+def _gauss_seidel_sweep(M, beta):
+    """Return a function computing one Gauss-Seidel sweep of v = beta*M.v + c
+
+    Splitting beta*M into its lower triangle (with the diagonal) L and strict
+    upper triangle U, a sweep solves (I - L).v_new = c + U.v_old, i.e. each
+    node already uses the updated values of the nodes before it.
+    """
+    n = M.shape[0]
+    if sp.issparse(M):
+        upper = beta*sp.triu(M, k=1, format='csr')
+        # natural ordering and no pivoting keep the triangular factor as is
+        lu = splu(sp.csc_matrix(sp.eye(n) - beta*sp.tril(M)),
+                  permc_spec='NATURAL', diag_pivot_thresh=0)
+        return lambda v, c: lu.solve(c + upper.dot(v))
+    M = np.asarray(M)
+    upper = beta*np.triu(M, k=1)
+    lower = np.eye(n) - beta*np.tril(M)
+    return lambda v, c: solve_triangular(lower, c + upper.dot(v), lower=True)
+
+
+def _solve_page_rank(M, c, beta, tol, max_iter, norm, method):
+    """Solve v = beta*M.v + c starting from a vector of ones
+
+    Parameters
+    ----------
+    M : numpy array or scipy.sparse matrix
+        Transition Matrix of shape (n, n)
+    c : numpy array
+        Teleport term of size n
+    beta :  float
+        probability of following an outlink
+    tol : float
+        Tolerance on the residual
+    max_iter : integer
+        Maximum number of iterations
+    norm : str
+        Residual between two iterates: 'sum' for the L1 norm of their
+        difference or 'mean' for its mean absolute value
+    method : str
+        One of PAGE_RANK_METHODS
+
+    Returns
+    -------
+    v : numpy array
+        Vector of size n containing the PageRank values
+    info : dict
+        'iterations': number of iterations and 'residuals': numpy array
+        of the residual of each iteration
+    """
+    if method not in PAGE_RANK_METHODS:
+        raise ValueError(f"method should be one of {PAGE_RANK_METHODS}")
+    n = M.shape[0]
+    scale = 1 if norm == 'sum' else n
+    if method == 'gauss_seidel':
+        sweep = _gauss_seidel_sweep(M, beta)
+    if method == 'adaptive':
+        # nodes still updated; rows of M are only re-sliced once the
+        # active nodes are fewer than half of the sliced rows
+        active = np.arange(n)
+        is_active = np.ones(n, dtype=bool)
+        rows = active
+        M_rows = M
+
+    v = np.ones(n)
+    history = [v]
+    residuals = []
+    delta = 1/tol  # initialize vector difference to a large number
+    i = 0
+    while delta > tol:
+        i += 1
+        prev_v = v
+        if method == 'gauss_seidel':
+            v = sweep(v, c)
+        elif method == 'adaptive':
+            v = v.copy()
+            updated = beta*np.asarray(M_rows.dot(prev_v)) + c[rows]
+            v[active] = updated[is_active[rows]]
+        else:
+            v = beta*M.dot(v) + c
+        change = np.abs(v-prev_v)
+        delta = np.sum(change)/scale
+        residuals.append(delta)
+
+        if method == 'extrapolation':
+            history = history[-2:] + [v]
+            if i % _EXTRAPOLATION_PERIOD == 0 and delta > tol:
+                # Aitken extrapolation along the dominant error direction
+                d0 = history[1] - history[0]
+                d1 = history[2] - history[1]
+                rate = d1.dot(d0)/d0.dot(d0)
+                if 0 < rate < 1:
+                    v = v + rate/(1-rate)*d1
+                    history = [v]
+        elif method == 'adaptive':
+            # freeze the nodes whose update is small relative to their share
+            # of the total rank, so that the frozen updates sum below tol
+            node_tol = tol*scale*np.abs(v[active])/np.sum(np.abs(v))
+            frozen = active[change[active] < node_tol]
+            is_active[frozen] = False
+            active = active[is_active[active]]
+            if len(active) < len(rows)/2:
+                rows = active
+                M_rows = M[rows]
+        if i >= max_iter or (method == 'adaptive' and len(active) == 0):
+            break
+    return v, {'iterations': i, 'residuals': np.array(residuals)}
+
+
+def taxed_page_rank(M, beta=0.8, tol=10**-6, max_iter=100, method='power',
+                    return_info=False):
     """Compute the Taxed PageRank (without Taxation) of a given Transition Matrix    
        Note that this not make use of `e` -- the vector of ones 
        since numpy's broadcasting takes care of properly computing a vector-constant addition
@@ -79,27 +446,39 @@ def taxed_page_rank(M, beta=0.8, tol=10**-6, max_iter=100):
         goes below this value
     max_iter : integer
         Maximum number of iterations
+    method : str
+        Solver strategy:
+
+        - 'power': Jacobi power iteration
+        - 'gauss_seidel': Gauss-Seidel sweeps, computed as one triangular
+          solve per iteration
+        - 'extrapolation': power iteration with an Aitken extrapolation
+          along the dominant error direction every few iterations
+        - 'adaptive': power iteration that stops updating (freezes) the
+          nodes whose values have converged
+    return_info : bool
+        If True, also return the number of iterations and the residual
+        history of the solve
 
     Returns
     -------
     v : numpy array
         Vector of size n containing the ordinary PageRank values 
+    info : dict
+        'iterations': number of iterations and 'residuals': numpy array
+        of the L1 distance between consecutive iterates; only returned if
+        return_info is True
     """
     n = M.shape[0]
-    v = np.ones(n)
-    delta = 1/tol  # initialize vector difference to a large number
-    i = 0
-    while delta > tol:
-        i += 1
-        prev_v = v
-        v = beta*M.dot(v) + ((1-beta)/n)
-        delta = np.sum(np.abs(v-prev_v))  # compute L1 norm
-        if i >= max_iter:
-            break
+    c = np.full(n, (1-beta)/n)
+    v, info = _solve_page_rank(M, c, beta, tol, max_iter, 'sum', method)
+    if return_info:
+        return v, info
     return v
 
 
-def topic_sensitive_page_rank(M, S, beta=0.8, tol=10**-6, max_iter=100):
+def topic_sensitive_page_rank(M, S, beta=0.8, tol=10**-6, max_iter=100,
+                              method='power', return_info=False):
     """Compute the topic-sensitive PageRank (with taxation) of a given Transition Matrix 
 
     Parameters
@@ -115,11 +494,21 @@ def topic_sensitive_page_rank(M, S, beta=0.8, tol=10**-6, max_iter=100):
         goes below this value
     max_iter : integer
         Maximum number of iterations
+    method : str
+        Solver strategy: 'power', 'gauss_seidel', 'extrapolation' or
+        'adaptive'; see taxed_page_rank
+    return_info : bool
+        If True, also return the number of iterations and the residual
+        history of the solve
 
     Returns
     -------
     v : numpy array
         Vector of size n containing the PageRank values 
+    info : dict
+        'iterations': number of iterations and 'residuals': numpy array
+        of the mean absolute difference between consecutive iterates; only
+        returned if return_info is True
     """
 
     n = M.shape[0]
@@ -127,19 +516,138 @@ def topic_sensitive_page_rank(M, S, beta=0.8, tol=10**-6, max_iter=100):
     for i in S:
         e[i] = 1
 
-    v = np.ones(n)
-    delta = 1/tol  # initialize to a large number
+    c = ((1-beta)/len(S))*e
+    v, info = _solve_page_rank(M, c, beta, tol, max_iter, 'mean', method)
+    if return_info:
+        return v, info
+    return v
+
+
+def page_rank(M, beta=0.8, teleport=None, dangling=None, tol=10**-6,
+              max_iter=100):
+    """Compute the PageRank of a given Transition Matrix, handling dead ends
+    and teleportation without modifying M
+
+    The rank of the dangling nodes (dead ends) and the taxed rank are
+    redistributed along the teleport vector as rank-one corrections of
+    each iteration, v = beta*(M.v + (sum of v over dangling nodes)*t) +
+    (1-beta)*t, so that M can stay sparse and each iteration costs
+    O(edges). The result always sums to 1.
+
+    Parameters
+    ----------
+    M : numpy array or scipy.sparse matrix
+        Transition Matrix: Array of shape (n, n), where n is the number of nodes in the network
+    beta :  float
+        probability of following an outlink. With beta=1, this is the
+        idealized PageRank with dead ends redistributed.
+    teleport : numpy array
+        Teleport vector t of size n, normalized to sum to 1. If None, the
+        uniform vector.
+    dangling : numpy array
+        Indices of the dangling nodes, e.g. from
+        transition_matrix(G, return_dangling=True). If None, the nodes
+        whose columns in M sum to zero.
+    tol : float
+        Tolerance: Iteration stops if the distance between previous and updated PageRank vectors 
+        goes below this value
+    max_iter : integer
+        Maximum number of iterations
+
+    Returns
+    -------
+    v : numpy array
+        Vector of size n containing the PageRank values
+    """
+    n = M.shape[0]
+    if teleport is None:
+        teleport = np.ones(n)/n
+    else:
+        teleport = np.asarray(teleport, dtype=float)
+        teleport = teleport/teleport.sum()
+    if dangling is None:
+        dangling = np.flatnonzero(np.asarray(M.sum(axis=0)).ravel() == 0)
+
+    v = np.ones(n)/n
+    delta = 1/tol  # initialize vector difference to a large number
     i = 0
     while delta > tol:
         i += 1
         prev_v = v
-        v = beta*M.dot(v) + ((1-beta)/len(S))*e
-        delta = np.mean(np.abs(v-prev_v))
+        dangling_mass = v[dangling].sum()
+        v = beta*(M.dot(v) + dangling_mass*teleport) + (1-beta)*teleport
+        v = v/v.sum()  # guard against round-off drift
+        delta = np.sum(np.abs(v-prev_v))  # compute L1 norm
         if i >= max_iter:
             break
     return v
 
 
+def batch_topic_sensitive_page_rank(M, S, beta=0.8, tol=10**-6, max_iter=100):
+    """Compute the topic-sensitive PageRank (with taxation) of several
+    teleport sets at once
+
+    The PageRank vectors of the k teleport sets are iterated together as
+    the columns of an n by k block, V = beta*M.V + (1-beta)*E, so that each
+    iteration is a single matrix-matrix product. Each column stops being
+    updated once it converges, which gives the same values as calling
+    topic_sensitive_page_rank on every teleport set.
+
+    Parameters
+    ----------
+    M : numpy array or scipy.sparse matrix
+        Transition Matrix: Array of shape (n, n), where n is the number of nodes in the network
+    S : list of list or scipy.sparse matrix
+        Indices of the pages of each teleport set (indices start at 0), or
+        a matrix of shape (n, k) whose nonzero entries in column j mark the
+        pages of teleport set j
+    beta :  float
+        probability of following an outlink
+    tol : float
+        Tolerance: Iteration of a column stops if the mean absolute difference
+        between its previous and updated PageRank vectors goes below this value
+    max_iter : integer
+        Maximum number of iterations
+
+    Returns
+    -------
+    V : numpy array
+        Array of shape (n, k) whose column j contains the PageRank values of
+        teleport set j
+    """
+    n = M.shape[0]
+    if sp.issparse(S):
+        E = (sp.csc_matrix(S) != 0).astype(float).toarray()
+    else:
+        E = np.zeros((n, len(S)))
+        for j, pages in enumerate(S):
+            E[list(pages), j] = 1
+    E = E/E.sum(axis=0)
+    k = E.shape[1]
+
+    V = np.ones((n, k))
+    # the columns that have not converged are kept in a compact block
+    active = np.arange(k)
+    V_active = V.copy()
+    E_active = (1-beta)*E
+    i = 0
+    while len(active) > 0:
+        i += 1
+        prev_V = V_active
+        V_active = beta*np.asarray(M.dot(prev_V))
+        V_active += E_active
+        delta = np.mean(np.abs(V_active-prev_V), axis=0)
+        done = delta <= tol
+        if i >= max_iter:
+            done[:] = True
+        if done.any():
+            V[:, active[done]] = V_active[:, done]
+            active = active[~done]
+            V_active = V_active[:, ~done]
+            E_active = E_active[:, ~done]
+    return V
+
+
 def spam_mass(M, S, beta=0.8, tol=10**-6, max_iter=100):
     """Compute the spam mass given a set of trustworthy pages
 
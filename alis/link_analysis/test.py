@@ -1,3 +1,6 @@
+import gzip
+import os
+import tempfile
 import unittest
 import numpy as np
 from numpy.testing import assert_almost_equal
@@ -96,6 +99,105 @@ class TransitionMatrixTests(unittest.TestCase):
         self.assertIsInstance(idealized_page_rank(M), np.ndarray)
         assert_almost_equal(M, M_expected, decimal=4)        
 
+    def test_G1_sparse(self):
+        G1 = nx.DiGraph()
+        G1.add_nodes_from(["A","B","C","D"])
+        G1.add_edges_from([
+            ("A","B"), ("A","C"), ("A","D"), 
+            ("B","A"), ("B","D"),
+            ("D","B"), ("D","C")
+        ])
+
+        M, dangling = transition_matrix(G1, sparse=True, return_dangling=True)
+        self.assertTrue(sp.issparse(M))
+        assert_almost_equal(M.toarray(), transition_matrix(G1), decimal=4)
+        assert_almost_equal(dangling, np.array([2]))
+
+    def test_sparse_page_rank(self):
+        G3 = nx.DiGraph()
+        G3.add_nodes_from(["A","B","C","D"])
+        G3.add_edges_from([
+            ("A","B"), ("A","C"), ("A","D"), 
+            ("B","A"), ("B","D"),
+            ("C","C"),
+            ("D","B"), ("D","C")
+        ])
+        M = transition_matrix(G3)
+        M_sparse = transition_matrix(G3, sparse=True)
+
+        for page_rank in [idealized_page_rank, taxed_page_rank]:
+            pagerank = page_rank(M_sparse)
+            self.assertIsInstance(pagerank, np.ndarray)
+            assert_almost_equal(pagerank, page_rank(M), decimal=4)
+        assert_almost_equal(
+            topic_sensitive_page_rank(M_sparse, [1, 3]),
+            topic_sensitive_page_rank(M, [1, 3]),
+            decimal=4
+        )
+        h, a = hits(sp.csr_matrix(M_sparse.T > 0, dtype=float))
+        h_expected, a_expected = hits((M.T > 0).astype(float))
+        assert_almost_equal(h, h_expected, decimal=4)
+        assert_almost_equal(a, a_expected, decimal=4)
+
+class EdgeListTests(unittest.TestCase):
+
+    def test_graph4(self):
+        path = os.path.join(
+            os.path.dirname(os.path.abspath(__file__)),
+            '..', 'datasets', 'data', 'graph4.csv')
+        src, dst, weights, nodes = read_edge_list(path, weight_col=2)
+        self.assertEqual(src.dtype, np.int32)
+        self.assertEqual(len(src), 8)
+        self.assertTrue(np.all(weights > 0))
+
+        # the file lists the (row, column, value) entries of M
+        M, nodes, dangling = load_transition_matrix(
+            path, src_col=1, dst_col=0, weight_col=2, return_dangling=True)
+        order = np.argsort(nodes)
+        M_expected = np.array([
+            [  0, 1/2, 1,   0],
+            [1/3,   0, 0, 1/2],
+            [1/3,   0, 0, 1/2],
+            [1/3, 1/2, 0,   0]
+            ])
+        assert_almost_equal(
+            M.toarray()[np.ix_(order, order)], M_expected, decimal=4)
+        self.assertEqual(len(dangling), 0)
+
+    def test_string_labels_in_chunks(self):
+        path = os.path.join(tempfile.mkdtemp(), 'edges.tsv.gz')
+        edges = [("alpha", "beta"), ("beta", "gamma"), ("gamma", "alpha"),
+                 ("alpha", "gamma"), ("delta", "alpha"), ("beta", "alpha")]
+        with gzip.open(path, 'wt') as f:
+            f.write("src\tdst\n")
+            for u, v in edges:
+                f.write(f"{u}\t{v}\n")
+
+        src, dst, weights, nodes = read_edge_list(
+            path, label_dtype=str, skiprows=1, chunk_size=2)
+        self.assertIsNone(weights)
+        self.assertEqual(list(nodes), ["alpha", "beta", "gamma", "delta"])
+        self.assertEqual(
+            [(nodes[u], nodes[v]) for u, v in zip(src, dst)], edges)
+
+        M, nodes = load_transition_matrix(
+            path, label_dtype=str, skiprows=1, chunk_size=2)
+        G = nx.DiGraph()
+        G.add_nodes_from(nodes)
+        G.add_edges_from(edges)
+        assert_almost_equal(M.toarray(), transition_matrix(G), decimal=4)
+
+    def test_int_labels_in_chunks(self):
+        path = os.path.join(tempfile.mkdtemp(), 'edges.csv')
+        rng = np.random.RandomState(0)
+        edges = rng.randint(0, 50, size=(300, 2))*1000
+        np.savetxt(path, edges, fmt='%d', delimiter=',')
+
+        src, dst, _, nodes = read_edge_list(path, chunk_size=7)
+        assert_almost_equal(nodes[src], edges[:, 0])
+        assert_almost_equal(nodes[dst], edges[:, 1])
+        self.assertEqual(len(nodes), len(np.unique(edges)))
+
 class TaxedPageRankTests(unittest.TestCase):     
     
     def test_G1(self):
@@ -116,6 +218,106 @@ class TaxedPageRankTests(unittest.TestCase):
         )        
         
         
+class PageRankTests(unittest.TestCase):
+
+    def test_G1(self):
+        M = np.array([
+            [  0, 1/2, 0,   0],
+            [1/3,   0, 0, 1/2],
+            [1/3,   0, 1, 1/2],
+            [1/3, 1/2, 0,   0]    
+            ])
+
+        pagerank = page_rank(M)
+        self.assertIsInstance(pagerank, np.ndarray)
+        assert_almost_equal(
+            pagerank, 
+            np.array([15/148, 19/148, 95/148, 19/148]),
+            decimal=4
+        )
+        assert_almost_equal(page_rank(sp.csr_matrix(M)), pagerank, decimal=6)
+
+    def test_dead_end(self):
+        M = np.array([
+            [  0, 1/2, 0,   0],
+            [1/3,   0, 0, 1/2],
+            [1/3,   0, 0, 1/2],
+            [1/3, 1/2, 0,   0]    
+            ])
+        n = M.shape[0]
+
+        # dense Google matrix with the dead end jumping uniformly
+        G = M.copy()
+        G[:, 2] = 1/n
+        G = 0.8*G + 0.2/n
+        vals, vecs = np.linalg.eig(G)
+        expected = np.real(vecs[:, np.argmax(np.real(vals))])
+        expected = expected/expected.sum()
+
+        pagerank = page_rank(sp.csr_matrix(M), dangling=np.array([2]))
+        assert_almost_equal(pagerank.sum(), 1)
+        assert_almost_equal(pagerank, expected, decimal=4)
+        assert_almost_equal(page_rank(M), pagerank, decimal=6)
+
+    def test_teleport(self):
+        M = np.array([
+            [  0, 1/2, 1,   0],
+            [1/3,   0, 0, 1/2],
+            [1/3,   0, 0, 1/2],
+            [1/3, 1/2, 0,   0]    
+            ])
+        teleport = np.array([0, 1, 0, 1])
+        pagerank = page_rank(M, teleport=teleport)
+        expected = topic_sensitive_page_rank(M, [1, 3])
+        assert_almost_equal(pagerank, expected/expected.sum(), decimal=4)
+
+class SolverMethodTests(unittest.TestCase):
+
+    def test_taxed(self):
+        M = np.array([
+            [  0, 1/2, 0,   0],
+            [1/3,   0, 0, 1/2],
+            [1/3,   0, 1, 1/2],
+            [1/3, 1/2, 0,   0]    
+            ])
+        expected = np.array([15/148, 19/148, 95/148, 19/148])
+
+        iterations = {}
+        for method in PAGE_RANK_METHODS:
+            for matrix in [M, sp.csr_matrix(M)]:
+                pagerank, info = taxed_page_rank(
+                    matrix, tol=10**-8, method=method, return_info=True)
+                self.assertIsInstance(pagerank, np.ndarray)
+                assert_almost_equal(pagerank, expected, decimal=4)
+                self.assertEqual(len(info['residuals']), info['iterations'])
+                self.assertLessEqual(info['residuals'][-1], 10**-8)
+            iterations[method] = info['iterations']
+
+        self.assertLess(iterations['gauss_seidel'], iterations['power'])
+        self.assertLess(iterations['extrapolation'], iterations['power'])
+
+    def test_topic_sensitive(self):
+        M = np.array([
+            [  0, 1/2, 1,   0],
+            [1/3,   0, 0, 1/2],
+            [1/3,   0, 0, 1/2],
+            [1/3, 1/2, 0,   0]    
+            ])
+        S = [1,3]
+
+        for method in PAGE_RANK_METHODS:
+            pagerank = topic_sensitive_page_rank(M, S, method=method)
+            assert_almost_equal(
+                pagerank, 
+                np.array([0.25714753, 0.2809555 , 0.1809555 , 0.2809555 ]),
+                decimal=4
+            )
+
+    def test_unknown_method(self):
+        M = np.eye(2)
+        with self.assertRaises(ValueError):
+            taxed_page_rank(M, method='jacobi')
+
 class TopicSensitivePageRankTests(unittest.TestCase):     
     
     def test_G1(self):
@@ -136,6 +338,32 @@ class TopicSensitivePageRankTests(unittest.TestCase):
             decimal=4
         )   
         
+class BatchTopicSensitivePageRankTests(unittest.TestCase):
+
+    def test_G1(self):
+        M = np.array([
+            [  0, 1/2, 1,   0],
+            [1/3,   0, 0, 1/2],
+            [1/3,   0, 0, 1/2],
+            [1/3, 1/2, 0,   0]    
+            ])
+
+        teleport_sets = [[1, 3], [0], [0, 1, 2, 3], [2, 3]]
+        V = batch_topic_sensitive_page_rank(M, teleport_sets)
+        self.assertEqual(V.shape, (4, 4))
+        for j, S in enumerate(teleport_sets):
+            assert_almost_equal(
+                V[:, j], topic_sensitive_page_rank(M, S), decimal=6)
+
+        E = sp.csc_matrix(np.array([
+            [0, 1, 1, 0],
+            [1, 0, 1, 0],
+            [0, 0, 1, 1],
+            [1, 0, 1, 1]
+            ]))
+        V_sparse = batch_topic_sensitive_page_rank(sp.csr_matrix(M), E)
+        assert_almost_equal(V_sparse, V, decimal=6)
+
 class SpamMassTests(unittest.TestCase):     
     
     def test_G1(self):
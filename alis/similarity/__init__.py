@@ -3,5 +3,16 @@ Functions that will be useful in
 calculating the similarity between two representations.
 """
 
-from ._jaccard import jaccard_sim
+from ._jaccard import (
+    jaccard_sim, characteristic_matrix, jaccard_sim_pairs, jaccard_sim_matrix,
+    bbit_jaccard_sim
+)
+from ._banding import BandBuckets, band_keys, bucket_pairs, unpack_pairs
+from ._forest import LSHForest
+from ._hamming import angular_sim, hamming_distance
+from ._index import LSHIndex
+from ._tuning import (
+    estimate_index_cost, optimal_bands, pstable_collision_prob,
+    optimal_pstable_bands, plot_pstable_thresh
+)
 from .minhash_lsh import LSH
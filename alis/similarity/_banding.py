@@ -0,0 +1,323 @@
+"""
+In-memory banding of signature matrices using numpy.
+
+Every band of every signature is hashed into a 64-bit bucket key in a
+vectorized way, and the buckets of each band are formed by sorting the
+keys. The buckets are stored as flat arrays instead of dictionaries of
+lists.
+"""
+
+import os
+
+import numpy as np
+
+from ..feature_extraction._hashing import fmix64, sorted_unique
+
+# Arrays of a BandBuckets, each stored as `<name>.npy` by `save`
+_BUCKET_ARRAYS = ('keys', 'offsets', 'doc_ids', 'band_ptr')
+
+# Odd multiplier used to combine the rows of a band into a single key
+_BAND_BASE = np.uint64(0x9e3779b97f4a7c15)
+
+
+def band_keys(signature, bands):
+    """Return the bucket key of each band of each signature
+
+    Parameters
+    ----------
+    signature : 2-D np.array
+        signatures with dimension n (samples) by m (signature size).
+        The integer values are hashed as 64-bit words.
+    bands : int
+        number of bands. Must be a factor of the signature size.
+
+    Returns
+    -------
+    keys : np.array of shape (n, bands)
+        uint64 bucket key of each band of each signature
+    """
+    signature = np.asarray(signature)
+    if signature.ndim == 1:
+        signature = signature[None, :]
+    n, signature_size = signature.shape
+    assert signature_size % bands == 0, "Number of bands not a factor of signature size."
+    r = signature_size // bands
+
+    rows = signature.reshape(n, bands, r)
+    keys = np.zeros((n, bands), dtype=np.uint64)
+    for j in range(r):
+        keys = keys * _BAND_BASE + rows[:, :, j].astype(np.uint64)
+    return fmix64(keys)
+
+
+def bucket_pairs(doc_ids, offsets, max_bucket_size=None):
+    """Return the distinct pairs of documents sharing a bucket
+
+    The pairs of all buckets are expanded at once with `np.repeat` and
+    packed into uint64 words `(i << 32) | j` with `i < j`, so that the
+    duplicates can be removed by sorting.
+
+    Parameters
+    ----------
+    doc_ids : np.array
+        non-negative integer indices (below 2**32) of the documents in
+        each bucket, laid out bucket after bucket
+    offsets : np.array
+        start of each bucket in `doc_ids` plus the end of the last one
+    max_bucket_size : int, default=None
+        buckets with more documents than this are skipped. If None, all
+        buckets are expanded.
+
+    Returns
+    -------
+    packed_pairs : np.array
+        sorted uint64 array of the distinct packed pairs
+    """
+    doc_ids = np.asarray(doc_ids, dtype=np.int64)
+    offsets = np.asarray(offsets, dtype=np.int64)
+    sizes = np.diff(offsets)
+    keep = sizes >= 2
+    if max_bucket_size is not None:
+        keep &= sizes <= max_bucket_size
+    starts, sizes = offsets[:-1][keep], sizes[keep]
+
+    # Each member pairs with the members after it in its bucket
+    members = np.repeat(starts, sizes) + _group_arange(sizes)
+    bucket_end = np.repeat(starts + sizes, sizes)
+    n_partners = bucket_end - members - 1
+    left = np.repeat(members, n_partners)
+    right = left + 1 + _group_arange(n_partners)
+
+    i, j = doc_ids[left], doc_ids[right]
+    lo = np.minimum(i, j).astype(np.uint64)
+    hi = np.maximum(i, j).astype(np.uint64)
+    return sorted_unique((lo << np.uint64(32)) | hi)
+
+
+def unpack_pairs(packed_pairs):
+    """Return the (num_pairs, 2) array of the packed pairs of
+    `bucket_pairs`"""
+    packed_pairs = np.asarray(packed_pairs, dtype=np.uint64)
+    return np.column_stack([
+        packed_pairs >> np.uint64(32),
+        packed_pairs & np.uint64(0xffffffff),
+    ]).astype(np.int64)
+
+
+def _group_arange(counts):
+    """Return the concatenation of np.arange(c) for each c in `counts`"""
+    counts = np.asarray(counts, dtype=np.int64)
+    ends = np.cumsum(counts)
+    return np.arange(ends[-1] if len(ends) else 0) - np.repeat(
+        ends - counts, counts)
+
+
+class BandBuckets:
+    """Buckets of all bands of a signature matrix stored as flat arrays.
+
+    The buckets of band `b` are the entries `band_ptr[b]` to
+    `band_ptr[b+1]` of `keys`. The documents of bucket `t` are
+    `doc_ids[offsets[t]:offsets[t+1]]`. Since every document falls in
+    exactly one bucket per band, band `b` covers the entries `b*n` to
+    `(b+1)*n` of `doc_ids`.
+
+    Attributes
+    ----------
+    keys : np.array of shape (num_buckets,)
+        uint64 key of each bucket, sorted within each band
+    offsets : np.array of shape (num_buckets + 1,)
+        start of each bucket in `doc_ids`
+    doc_ids : np.array of shape (bands * n,)
+        row indices of the documents in each bucket
+    band_ptr : np.array of shape (bands + 1,)
+        start of each band in `keys`
+    """
+
+    def __init__(self, keys, offsets, doc_ids, band_ptr):
+        """Initialize class
+
+        Parameters
+        ----------
+        keys : np.array of shape (num_buckets,)
+            uint64 key of each bucket, sorted within each band
+        offsets : np.array of shape (num_buckets + 1,)
+            start of each bucket in `doc_ids`
+        doc_ids : np.array of shape (bands * n,)
+            row indices of the documents in each bucket
+        band_ptr : np.array of shape (bands + 1,)
+            start of each band in `keys`
+        """
+        self.keys = keys
+        self.offsets = offsets
+        self.doc_ids = doc_ids
+        self.band_ptr = band_ptr
+
+    @classmethod
+    def from_keys(cls, keys):
+        """Return the buckets formed by the given band keys
+
+        Parameters
+        ----------
+        keys : np.array of shape (n, bands)
+            bucket key of each band of each document, e.g., the output
+            of `band_keys`
+
+        Returns
+        -------
+        buckets : BandBuckets
+        """
+        n, bands = keys.shape
+        # Sort each band (column) and lay the bands out one after another
+        order = np.argsort(keys, axis=0, kind='stable')
+        sorted_keys = np.take_along_axis(keys, order, axis=0).T.ravel()
+        doc_ids = order.T.ravel()
+
+        is_start = np.ones(n * bands, dtype=bool)
+        is_start[1:] = sorted_keys[1:] != sorted_keys[:-1]
+        # The first document of each band always starts a new bucket
+        is_start[::max(n, 1)] = True
+        starts = np.flatnonzero(is_start)
+
+        offsets = np.append(starts, n * bands)
+        band_ptr = np.searchsorted(starts, np.arange(bands + 1) * n)
+        if n < 2**31:
+            doc_ids = doc_ids.astype(np.int32)
+        return cls(sorted_keys[starts], offsets, doc_ids, band_ptr)
+
+    @classmethod
+    def from_signature(cls, signature, bands):
+        """Return the buckets of the given signature matrix
+
+        Parameters
+        ----------
+        signature : 2-D np.array
+            signatures with dimension n (samples) by m (signature size)
+        bands : int
+            number of bands
+
+        Returns
+        -------
+        buckets : BandBuckets
+        """
+        return cls.from_keys(band_keys(signature, bands))
+
+    def save(self, path):
+        """Save the buckets as one `.npy` file per array in the directory
+        `path`
+
+        Parameters
+        ----------
+        path : str
+            directory in which to write the arrays. It is created if it
+            does not exist.
+        """
+        os.makedirs(path, exist_ok=True)
+        for name in _BUCKET_ARRAYS:
+            np.save(os.path.join(path, f'{name}.npy'), getattr(self, name),
+                    allow_pickle=False)
+
+    @classmethod
+    def load(cls, path, mmap=True):
+        """Return the buckets saved in the directory `path`
+
+        Parameters
+        ----------
+        path : str
+            directory written by `save`
+        mmap : bool, default=True
+            whether to memory-map the arrays instead of reading them.
+            Memory-mapped buckets need no deserialization and their
+            pages are shared by all processes loading the same files.
+
+        Returns
+        -------
+        buckets : BandBuckets
+        """
+        mmap_mode = 'r' if mmap else None
+        return cls(*(
+            np.load(os.path.join(path, f'{name}.npy'), mmap_mode=mmap_mode,
+                    allow_pickle=False)
+            for name in _BUCKET_ARRAYS
+        ))
+
+    @property
+    def bands(self):
+        """Number of bands"""
+        return len(self.band_ptr) - 1
+
+    @property
+    def n_docs(self):
+        """Number of documents"""
+        return len(self.doc_ids) // max(self.bands, 1)
+
+    def bucket_sizes(self):
+        """Return the number of documents of each bucket"""
+        return np.diff(self.offsets)
+
+    def band(self, band):
+        """Return the keys, offsets and document indices of a band
+
+        Parameters
+        ----------
+        band : int
+            band label
+
+        Returns
+        -------
+        keys, offsets, doc_ids : tuple of np.array
+            sorted bucket keys of the band, the start of each bucket in
+            `doc_ids` plus the end of the last one, and the document
+            indices of the band
+        """
+        lo, hi = self.band_ptr[band], self.band_ptr[band + 1]
+        offsets = self.offsets[lo:hi + 1] - self.offsets[lo]
+        doc_ids = self.doc_ids[self.offsets[lo]:self.offsets[hi]]
+        return self.keys[lo:hi], offsets, doc_ids
+
+    def lookup(self, keys):
+        """Return the documents sharing at least one bucket with the
+        given band keys
+
+        Parameters
+        ----------
+        keys : np.array of shape (bands,)
+            bucket key of each band of the query, e.g., a row of the
+            output of `band_keys`
+
+        Returns
+        -------
+        doc_ids : np.array
+            sorted indices of the candidate documents
+        """
+        keys = np.asarray(keys, dtype=np.uint64).ravel()
+        found = []
+        for band, key in enumerate(keys):
+            lo, hi = self.band_ptr[band], self.band_ptr[band + 1]
+            t = lo + np.searchsorted(self.keys[lo:hi], key)
+            if t < hi and self.keys[t] == key:
+                found.append(self.doc_ids[self.offsets[t]:self.offsets[t + 1]])
+        if not found:
+            return np.empty(0, dtype=self.doc_ids.dtype)
+        return sorted_unique(np.concatenate(found))
+
+    def candidate_pairs(self, max_bucket_size=None):
+        """Return the distinct pairs of documents sharing a bucket in at
+        least one band
+
+        Parameters
+        ----------
+        max_bucket_size : int, default=None
+            buckets with more documents than this are skipped. If None,
+            all buckets are expanded.
+
+        Returns
+        -------
+        pairs : np.array of shape (num_pairs, 2)
+            sorted pairs (i, j) of document indices with i < j
+        """
+        packed = [
+            bucket_pairs(doc_ids, offsets, max_bucket_size)
+            for _, offsets, doc_ids in map(self.band, range(self.bands))
+        ]
+        packed = sorted_unique(np.concatenate(packed)) if packed else []
+        return unpack_pairs(packed)
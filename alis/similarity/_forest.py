@@ -0,0 +1,188 @@
+"""
+LSH Forest: a prefix-tree alternative to the fixed banding of `LSH`.
+
+Each tree indexes a slice of `depth` signature rows. Instead of requiring
+a match on all rows of a band, a query descends every tree as long as
+its prefix matches and collects the documents sharing the longest
+prefixes. The effective band size thus adapts to each query, which
+reaches a target recall with far fewer stored tables than banding.
+The trees are stored as lexicographically sorted arrays, so that each
+descent is a sequence of binary searches.
+"""
+
+import numpy as np
+
+from ..feature_extraction._hashing import sorted_unique
+
+
+class LSHForest:
+    """LSH Forest index over minhash (or other integer) signatures.
+
+    Attributes
+    ----------
+    num_trees : int
+        number of prefix trees
+    depth : int
+        maximum prefix length, i.e., number of signature rows per tree
+    ids_ : np.array or None
+        document identifiers of the indexed signature rows
+    sorted_rows_ : list of np.array
+        signature rows of each tree of shape (n, depth), sorted
+        lexicographically
+    order_ : list of np.array
+        signature row index of each entry of `sorted_rows_`
+    """
+
+    def __init__(self, num_trees, depth):
+        """Initialize class
+
+        Parameters
+        ----------
+        num_trees : int
+            number of prefix trees
+        depth : int
+            maximum prefix length. Tree t indexes the signature rows
+            `t*depth` to `(t+1)*depth`, so the signatures should have at
+            least `num_trees * depth` values.
+        """
+        self.num_trees = num_trees
+        self.depth = depth
+        self.ids_ = None
+        self.sorted_rows_ = []
+        self.order_ = []
+
+    def _tree_rows(self, signature, tree):
+        """Return the signature rows indexed by the given tree"""
+        return signature[..., tree*self.depth:(tree+1)*self.depth]
+
+    def fit(self, signature, ids=None):
+        """Build the trees of the given signature matrix
+
+        Parameters
+        ----------
+        signature : 2-D np.array
+            signatures with dimension n (samples) by m (signature size)
+        ids : array-like of shape (n,), default=None
+            document identifiers. If None, the signature row indices are
+            used.
+
+        Returns
+        -------
+        self : LSHForest
+        """
+        signature = np.asarray(signature)
+        assert signature.shape[1] >= self.num_trees * self.depth, "Signature size smaller than num_trees * depth."
+        self.ids_ = None if ids is None else np.asarray(ids)
+        self.sorted_rows_ = []
+        self.order_ = []
+        for tree in range(self.num_trees):
+            rows = self._tree_rows(signature, tree)
+            # np.lexsort sorts by the last key first
+            order = np.lexsort(rows.T[::-1])
+            self.sorted_rows_.append(rows[order])
+            self.order_.append(order)
+        return self
+
+    def _descend(self, tree, query):
+        """Return the [lo, hi) range of the sorted entries of a tree that
+        share a prefix of length x with the query, for x = 0, 1, ..."""
+        sorted_rows = self.sorted_rows_[tree]
+        lo, hi = 0, len(sorted_rows)
+        ranges = [(lo, hi)]
+        for c, value in enumerate(self._tree_rows(query, tree)):
+            column = sorted_rows[lo:hi, c]
+            new_lo = lo + np.searchsorted(column, value, side='left')
+            new_hi = lo + np.searchsorted(column, value, side='right')
+            if new_lo == new_hi:
+                break
+            lo, hi = new_lo, new_hi
+            ranges.append((lo, hi))
+        return ranges
+
+    def query(self, signature, num_candidates=10, min_depth=1):
+        """Return the documents sharing the longest prefixes with the
+        given signature
+
+        All trees are descended synchronously: starting from the longest
+        matched prefix, documents sharing a prefix of the current length
+        in any tree are collected and the length is decreased until at
+        least `num_candidates` documents are found or `min_depth` is
+        reached.
+
+        Parameters
+        ----------
+        signature : 1-D np.array
+            signature of the query document
+        num_candidates : int, default=10
+            minimum number of candidates to collect, if possible
+        min_depth : int, default=1
+            shortest prefix length considered a match
+
+        Returns
+        -------
+        candidates : np.array
+            identifiers of the candidate documents (signature row
+            indices if no ids were given)
+        """
+        signature = np.asarray(signature)
+        ranges = [self._descend(tree, signature)
+                  for tree in range(self.num_trees)]
+        max_prefix = max(len(tree_ranges) - 1 for tree_ranges in ranges)
+
+        rows = np.empty(0, dtype=np.int64)
+        for x in range(max_prefix, min_depth - 1, -1):
+            found = [self.order_[tree][tree_ranges[x][0]:tree_ranges[x][1]]
+                     for tree, tree_ranges in enumerate(ranges)
+                     if len(tree_ranges) > x]
+            rows = sorted_unique(np.concatenate([rows] + found))
+            if len(rows) >= num_candidates:
+                break
+        return rows if self.ids_ is None else self.ids_[rows]
+
+    def _prob_of_s(self, s, depth=None):
+        """Return the probability that a document with similarity s shares
+        a prefix of length `depth` (default: the full depth) with the
+        query in at least one tree"""
+        if depth is None:
+            depth = self.depth
+        return 1 - (1 - s**depth)**self.num_trees
+
+    def empirical_recall(self, signature, queries, threshold,
+                         num_candidates=10, min_depth=1):
+        """Return the fraction of similar documents that are returned by
+        `query` for a sample of indexed documents
+
+        Documents are considered similar to a query if the fraction of
+        agreeing signature values is at least `threshold`.
+
+        Parameters
+        ----------
+        signature : 2-D np.array
+            the indexed signature matrix
+        queries : array-like of int
+            signature row indices of the sample of query documents
+        threshold : float
+            minimum estimated similarity of the relevant documents
+        num_candidates : int, default=10
+            passed to `query`
+        min_depth : int, default=1
+            passed to `query`
+
+        Returns
+        -------
+        recall : float
+            fraction of the relevant (query, document) pairs found,
+            excluding each query itself
+        """
+        signature = np.asarray(signature)
+        found = relevant = 0
+        for q in np.asarray(queries).ravel():
+            sims = (signature == signature[q]).mean(axis=1)
+            similar = np.flatnonzero(sims >= threshold)
+            similar = similar[similar != q]
+            candidates = self.query(signature[q], num_candidates, min_depth)
+            if self.ids_ is not None:
+                similar = self.ids_[similar]
+            found += np.isin(similar, candidates).sum()
+            relevant += len(similar)
+        return found / relevant if relevant else 1.0
@@ -0,0 +1,46 @@
+"""
+Module definition of the Hamming distance between packed bit
+signatures, e.g., SimHash signatures.
+"""
+
+import numpy as np
+
+from ..feature_extraction._hashing import popcount
+
+
+def hamming_distance(X, Y):
+    """Return the number of differing bits between the rows of X and the
+    corresponding rows of Y
+
+    Parameters
+    ----------
+    X, Y : uint arrays of shape (n, num_words) or (num_words,)
+        Packed bit signatures, e.g., the output of `simhash_signatures`
+
+    Returns
+    -------
+    distances : np.array of shape (n,) or int
+        Hamming distance of each pair of rows
+    """
+    return popcount(np.asarray(X) ^ np.asarray(Y)).sum(axis=-1,
+                                                       dtype=np.int64)
+
+
+def angular_sim(X, Y, num_bits):
+    """Return the angular similarity 1 - theta / pi estimated from the
+    packed SimHash signatures X and Y, i.e., the fraction of equal bits
+
+    Parameters
+    ----------
+    X, Y : uint arrays of shape (n, num_words) or (num_words,)
+        Packed SimHash signatures
+    num_bits : int
+        Number of bits per signature
+
+    Returns
+    -------
+    sims : np.array of shape (n,) or float
+        Estimated angular similarity of each pair of rows. The cosine
+        similarity is `cos(pi * (1 - sims))`.
+    """
+    return 1 - hamming_distance(X, Y) / num_bits
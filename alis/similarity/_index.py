@@ -0,0 +1,143 @@
+"""
+Mutable LSH index supporting the insertion, removal and querying of
+individual documents.
+
+Each band has its own hash table mapping a bucket key to the documents
+in that bucket, so that every operation costs O(bands) dictionary
+operations regardless of the number of indexed documents.
+"""
+
+import numpy as np
+
+from ._banding import band_keys
+
+
+class LSHIndex:
+    """Incremental LSH index over minhash (or other integer) signatures.
+
+    Attributes
+    ----------
+    bands : int
+        number of bands
+    r : int
+        number of rows per band
+    tables : list of dict
+        hash table of each band mapping a bucket key to the set of
+        document identifiers in the bucket
+    """
+
+    def __init__(self, bands, r):
+        """Initialize class
+
+        Parameters
+        ----------
+        bands : int
+            number of bands
+        r : int
+            number of rows per band. Signatures should have `bands * r`
+            values.
+        """
+        self.bands = bands
+        self.r = r
+        self.tables = [{} for _ in range(bands)]
+        self._doc_keys = {}
+
+    def __len__(self):
+        return len(self._doc_keys)
+
+    def __contains__(self, doc_id):
+        return doc_id in self._doc_keys
+
+    def _keys(self, signatures):
+        """Return the band keys of the given signatures as lists"""
+        signatures = np.asarray(signatures)
+        if signatures.ndim == 1:
+            signatures = signatures[None, :]
+        if signatures.shape[1] != self.bands * self.r:
+            raise ValueError(
+                f"Expected signatures of size {self.bands * self.r}, "
+                f"got {signatures.shape[1]}")
+        return band_keys(signatures, self.bands).tolist()
+
+    def insert(self, doc_id, signature):
+        """Add a document to the index
+
+        Parameters
+        ----------
+        doc_id : hashable
+            document identifier, which should not be in the index yet
+        signature : 1-D np.array
+            signature of the document
+        """
+        self.insert_many([doc_id], [signature])
+
+    def insert_many(self, doc_ids, signatures):
+        """Add several documents to the index, hashing their bands at once
+
+        Parameters
+        ----------
+        doc_ids : iterable of hashable
+            document identifiers, which should not be in the index yet
+        signatures : 2-D np.array
+            signatures of the documents with dimension n (samples) by m
+            (signature size)
+
+        Raises
+        ------
+        ValueError
+            if the numbers of identifiers and signatures differ, or if an
+            identifier is repeated or already indexed. The index is left
+            unchanged.
+        """
+        doc_ids = list(doc_ids)
+        all_keys = self._keys(signatures)
+        if len(doc_ids) != len(all_keys):
+            raise ValueError(f"Got {len(doc_ids)} document identifiers for "
+                             f"{len(all_keys)} signatures")
+        seen = set()
+        for doc_id in doc_ids:
+            if doc_id in self._doc_keys:
+                raise ValueError(f"Document {doc_id!r} is already indexed")
+            if doc_id in seen:
+                raise ValueError(f"Document {doc_id!r} is repeated")
+            seen.add(doc_id)
+
+        for doc_id, keys in zip(doc_ids, all_keys):
+            for table, key in zip(self.tables, keys):
+                table.setdefault(key, set()).add(doc_id)
+            self._doc_keys[doc_id] = keys
+
+    def remove(self, doc_id):
+        """Remove a document from the index
+
+        Parameters
+        ----------
+        doc_id : hashable
+            identifier of an indexed document
+        """
+        keys = self._doc_keys.pop(doc_id)
+        for table, key in zip(self.tables, keys):
+            bucket = table[key]
+            bucket.discard(doc_id)
+            if not bucket:
+                del table[key]
+
+    def query(self, signature):
+        """Return the documents sharing a bucket with the given signature
+        in at least one band
+
+        Parameters
+        ----------
+        signature : 1-D np.array
+            signature of the query document
+
+        Returns
+        -------
+        candidates : set
+            identifiers of the candidate documents
+        """
+        keys = self._keys(signature)[0]
+        candidates = set()
+        for table, key in zip(self.tables, keys):
+            candidates.update(table.get(key, ()))
+        return candidates
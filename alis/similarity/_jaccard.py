@@ -3,8 +3,16 @@ Module definition of jaccard similarity between two
 sets given the characteristic matrix representation.
 """
 
+import numpy as np
+from scipy import sparse
 from scipy.spatial.distance import jaccard
 
+from ..feature_extraction._hashing import popcount
+
+# Maximum number of candidate pairs compared at once by
+# `jaccard_sim_pairs`
+_BATCH_SIZE = 2**16
+
 
 def jaccard_sim(characteristic_matrix, i, j):
     """Return the jaccard similarity of sets i and j given the
@@ -12,7 +20,7 @@ def jaccard_sim(characteristic_matrix, i, j):
 
     Parameters
     ----------
-    characteristic_matrix : arr
+    characteristic_matrix : arr or scipy.sparse matrix
         Array of shape (num_items, num_sets) containing the
         characteristic matrix in which the Jaccard similarity is to be
         computed
@@ -26,5 +34,185 @@ def jaccard_sim(characteristic_matrix, i, j):
     sim : float
         Jaccard similarity between the chosen sets i and j
     """
+    if sparse.issparse(characteristic_matrix):
+        columns = sparse.csc_matrix(characteristic_matrix[:, [i, j]])
+        return jaccard_sim_pairs(columns.T, [(0, 1)])[0]
     return 1 - jaccard(characteristic_matrix[:, i],
                        characteristic_matrix[:, j])
+
+
+def characteristic_matrix(shingle_sets, num_items=None):
+    """Return the sparse characteristic matrix of the given sets of
+    shingle ids
+
+    Unlike the dense layout expected by `jaccard_sim`, each row of the
+    returned matrix corresponds to a set, so that the sets can be
+    sliced efficiently. Its transpose is the usual (num_items,
+    num_sets) characteristic matrix.
+
+    Parameters
+    ----------
+    shingle_sets : iterable of iterable of int
+        Shingle ids of each set, e.g., the output of `hashed_shingles`,
+        `hashed_word_shingles` or `rolling_shingles`
+    num_items : int, default=None
+        Number of possible shingle ids, in which case shingle id x is
+        column x. If not specified, the distinct shingle ids are mapped
+        to consecutive columns in increasing order, which keeps the
+        matrix narrow for 64-bit ids such as those of
+        `rolling_shingles`. Matrices compared with each other, e.g.,
+        by `jaccard_sim_matrix(X, Y)`, should then be built in a single
+        call and sliced.
+
+    Returns
+    -------
+    matrix : scipy.sparse.csr_matrix of shape (num_sets, num_items)
+        Binary matrix whose entry (i, x) is 1 if set i contains shingle
+        x (or the x-th smallest shingle id if num_items is None)
+    """
+    rows = []
+    for shingles in shingle_sets:
+        if isinstance(shingles, (set, frozenset)):
+            shingles = np.fromiter(shingles, dtype=np.uint64,
+                                   count=len(shingles))
+        rows.append(np.asarray(shingles, dtype=np.uint64).ravel())
+
+    indptr = np.zeros(len(rows) + 1, dtype=np.int64)
+    np.cumsum([len(row) for row in rows], out=indptr[1:])
+    ids = np.concatenate(rows) if rows else np.empty(0, np.uint64)
+    if num_items is None:
+        # Map the distinct ids to their rank
+        order = np.argsort(ids, kind='stable')
+        is_new = np.ones(len(ids), dtype=bool)
+        is_new[1:] = ids[order[1:]] != ids[order[:-1]]
+        indices = np.empty(len(ids), dtype=np.int64)
+        indices[order] = np.cumsum(is_new) - 1
+        num_items = int(is_new.sum())
+    else:
+        if len(ids) and int(ids.max()) >= num_items:
+            raise ValueError("Shingle ids should be less than num_items")
+        indices = ids.astype(np.int64)
+
+    matrix = sparse.csr_matrix(
+        (np.ones(len(indices), dtype=np.int32), indices, indptr),
+        shape=(len(rows), num_items))
+    # Remove repeated shingles within a set
+    matrix.sum_duplicates()
+    matrix.data[:] = 1
+    return matrix
+
+
+def _as_binary_csr(matrix):
+    """Return the given set-by-item matrix as a binary CSR matrix"""
+    matrix = sparse.csr_matrix(matrix, copy=True)
+    matrix.eliminate_zeros()
+    matrix.data = np.ones(len(matrix.data), dtype=np.int32)
+    return matrix
+
+
+def jaccard_sim_pairs(matrix, pairs):
+    """Return the exact jaccard similarity of each pair of sets in
+    `pairs`
+
+    The intersection sizes are obtained from the element-wise product
+    of the sparse rows of each pair, processed in batches.
+
+    Parameters
+    ----------
+    matrix : arr or scipy.sparse matrix
+        Matrix of shape (num_sets, num_items) whose rows are the sets,
+        e.g., the output of `characteristic_matrix`
+    pairs : array-like of shape (num_pairs, 2)
+        Row indices of the sets to compare
+
+    Returns
+    -------
+    sims : array of shape (num_pairs,)
+        Jaccard similarity of each pair. Two empty sets have a
+        similarity of 1.
+    """
+    matrix = _as_binary_csr(matrix)
+    pairs = np.asarray(pairs, dtype=np.int64).reshape(-1, 2)
+    sizes = matrix.getnnz(axis=1)
+
+    sims = np.empty(len(pairs), dtype=float)
+    for start in range(0, len(pairs), _BATCH_SIZE):
+        i, j = pairs[start:start + _BATCH_SIZE].T
+        intersection = matrix[i].multiply(matrix[j]).getnnz(axis=1)
+        union = sizes[i] + sizes[j] - intersection
+        with np.errstate(invalid='ignore', divide='ignore'):
+            sims[start:start + len(i)] = np.where(
+                union > 0, intersection / union, 1.0)
+    return sims
+
+
+def jaccard_sim_matrix(X, Y=None):
+    """Return the exact jaccard similarities between every set in `X`
+    and every set in `Y`
+
+    The intersection sizes of the whole block are obtained from a
+    single sparse matrix product.
+
+    Parameters
+    ----------
+    X : arr or scipy.sparse matrix
+        Matrix of shape (num_sets_x, num_items) whose rows are the sets
+    Y : arr or scipy.sparse matrix, default=None
+        Matrix of shape (num_sets_y, num_items) whose rows are the sets.
+        If not specified, the similarities among the sets of `X` are
+        computed.
+
+    Returns
+    -------
+    sims : array of shape (num_sets_x, num_sets_y)
+        Jaccard similarity of each pair of sets. Two empty sets have a
+        similarity of 1.
+    """
+    X = _as_binary_csr(X)
+    Y = X if Y is None else _as_binary_csr(Y)
+    intersection = (X @ Y.T).toarray()
+    union = (X.getnnz(axis=1)[:, None] + Y.getnnz(axis=1)[None, :]
+             - intersection)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(union > 0, intersection / union, 1.0)
+
+
+def bbit_jaccard_sim(X, Y, num_bits, num_hash):
+    """Return the Jaccard similarity estimated from packed b-bit minhash
+    signatures
+
+    The fraction P of equal b-bit values is corrected for the values
+    that collide by chance, $J = (P - 2^{-b}) / (1 - 2^{-b})$, and
+    clipped to [0, 1]. Equal values are counted with a XOR and a
+    popcount on the packed words.
+
+    Parameters
+    ----------
+    X, Y : arrays of shape (n, num_words) or (num_words,)
+        Packed signatures, e.g., the output of `pack_bits`. Rows of X
+        are compared to the corresponding rows of Y.
+    num_bits : {1, 2, 4, 8}
+        Number of bits per signature value
+    num_hash : int
+        Number of signature values
+
+    Returns
+    -------
+    sims : np.array of shape (n,) or float
+        Estimated Jaccard similarity of each pair of rows
+    """
+    X, Y = np.asarray(X), np.asarray(Y)
+    dtype = np.result_type(X, Y)
+    word_bits = dtype.itemsize * 8
+    # Set bit at the lowest position of every b-bit field
+    field_mask = dtype.type(sum(1 << i for i in range(0, word_bits,
+                                                      num_bits)))
+    diff = X.astype(dtype) ^ Y.astype(dtype)
+    differs = diff
+    for shift in range(1, num_bits):
+        differs = differs | (diff >> dtype.type(shift))
+    mismatches = popcount(differs & field_mask).sum(axis=-1,
+                                                    dtype=np.int64)
+    collision = 2.0**-num_bits
+    equal = 1 - mismatches / num_hash
+    return np.clip((equal - collision) / (1 - collision), 0, 1)
@@ -0,0 +1,281 @@
+"""
+Selection of the number of bands and rows of an LSH index.
+
+The false positive and false negative probabilities of a (b, r) banding
+are obtained by integrating the S-curve below and above the target
+similarity threshold. The candidate volume and memory of the resulting
+index can be estimated from a sample of the signatures before building
+it.
+
+The same selection is available for the p-stable (E2LSH) family, where
+the collision probability is a function of the Euclidean distance.
+"""
+
+import matplotlib.pyplot as plt
+import numpy as np
+from scipy.integrate import quad
+from scipy.stats import norm
+
+from ._banding import BandBuckets
+
+
+def prob_of_candidate(s, bands, r):
+    """Return the probability that two documents with similarity s
+    become a candidate pair given b bands of r rows"""
+    return 1 - (1 - s**r)**bands
+
+
+def false_positive_probability(threshold, bands, r):
+    """Return the area under the S-curve below `threshold`"""
+    return quad(prob_of_candidate, 0.0, threshold, args=(bands, r))[0]
+
+
+def false_negative_probability(threshold, bands, r):
+    """Return the area above the S-curve from `threshold` to 1"""
+    return quad(lambda s: 1 - prob_of_candidate(s, bands, r),
+                threshold, 1.0)[0]
+
+
+def estimate_index_cost(sample, bands, n_docs=None):
+    """Return the expected candidate volume and memory of a numpy backend
+    LSH index, extrapolated from a sample of its signatures
+
+    Parameters
+    ----------
+    sample : 2-D np.array
+        random sample of the signatures with dimension n_sample by m
+        (signature size)
+    bands : int
+        number of bands
+    n_docs : int, default=None
+        number of documents of the full index. If None, the sample is
+        the full index.
+
+    Returns
+    -------
+    cost : dict of float
+        'candidate_pairs': expected number of distinct candidate pairs,
+        'bucket_pairs': expected number of pairs before deduplication
+        across bands, 'index_bytes': expected size of the buckets and
+        'build_bytes': expected peak memory of the temporary arrays
+        used by `get_buckets`
+    """
+    sample = np.asarray(sample)
+    n_sample = len(sample)
+    if n_docs is None:
+        n_docs = n_sample
+    buckets = BandBuckets.from_signature(sample, bands)
+    sizes = buckets.bucket_sizes().astype(float)
+
+    # Pairs scale with the number of document pairs
+    pair_scale = (n_docs * (n_docs - 1)) / max(n_sample * (n_sample - 1), 1)
+    # Buckets scale at most linearly with the number of documents
+    num_buckets = len(buckets.keys) * n_docs / max(n_sample, 1)
+    doc_id_bytes = 4 if n_docs < 2**31 else 8
+    return {
+        'candidate_pairs': float(len(buckets.candidate_pairs()) * pair_scale),
+        'bucket_pairs': float((sizes * (sizes - 1) / 2).sum() * pair_scale),
+        'index_bytes': float(16 * num_buckets + 8
+                             + doc_id_bytes * n_docs * bands
+                             + 8 * (bands + 1)),
+        'build_bytes': float(16 * n_docs * bands),
+    }
+
+
+def optimal_bands(threshold, signature_size, false_positive_weight=0.5,
+                  false_negative_weight=0.5, sample=None, n_docs=None,
+                  max_memory=None):
+    """Return the number of bands and rows minimizing the weighted sum of
+    the false positive and false negative probabilities
+
+    Only the numbers of bands dividing `signature_size` are considered,
+    as required by `LSH.make_bands`.
+
+    Parameters
+    ----------
+    threshold : float
+        target Jaccard similarity threshold
+    signature_size : int
+        number of values of each signature
+    false_positive_weight : float, default=0.5
+        weight of the false positive probability
+    false_negative_weight : float, default=0.5
+        weight of the false negative probability
+    sample : 2-D np.array, default=None
+        random sample of the signatures. Together with `max_memory`,
+        it is used to discard the configurations whose estimated
+        `index_bytes + build_bytes` exceed the budget.
+    n_docs : int, default=None
+        number of documents of the full index, passed to
+        `estimate_index_cost`
+    max_memory : int, default=None
+        memory budget in bytes
+
+    Returns
+    -------
+    bands, r : tuple of int
+        optimal number of bands and rows per band
+    """
+    best, best_error = None, np.inf
+    for bands in range(1, signature_size + 1):
+        if signature_size % bands:
+            continue
+        r = signature_size // bands
+        if max_memory is not None and sample is not None:
+            cost = estimate_index_cost(sample, bands, n_docs)
+            if cost['index_bytes'] + cost['build_bytes'] > max_memory:
+                continue
+        error = (
+            false_positive_weight
+            * false_positive_probability(threshold, bands, r)
+            + false_negative_weight
+            * false_negative_probability(threshold, bands, r)
+        )
+        if error < best_error:
+            best, best_error = (bands, r), error
+    if best is None:
+        raise ValueError("No number of bands fits within max_memory")
+    return best
+
+
+def pstable_collision_prob(distance, w):
+    """Return the probability that two points at Euclidean distance
+    `distance` share the value of a p-stable projection of width `w`
+
+    Parameters
+    ----------
+    distance : float or np.array
+        Euclidean distance between the points
+    w : float
+        Bucket width of the projection
+
+    Returns
+    -------
+    prob : float or np.array
+        Collision probability of a single projection
+    """
+    distance = np.asarray(distance, dtype=np.float64)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        x = w / distance
+        prob = (1 - 2 * norm.cdf(-x)
+                - 2 / (np.sqrt(2 * np.pi) * x) * (1 - np.exp(-x**2 / 2)))
+    prob = np.where(distance > 0, prob, 1.0)
+    return prob if prob.ndim else float(prob)
+
+
+def pstable_candidate_prob(distance, w, bands, r):
+    """Return the probability that two points at Euclidean distance
+    `distance` become a candidate pair given b bands of r p-stable
+    projections of width `w`"""
+    return prob_of_candidate(pstable_collision_prob(distance, w), bands, r)
+
+
+def optimal_pstable_bands(radius, signature_size, max_distance=None,
+                          widths=None, false_positive_weight=0.5,
+                          false_negative_weight=0.5):
+    """Return the bucket width, number of bands and rows of a p-stable
+    LSH index minimizing the weighted sum of the false positive and false
+    negative areas
+
+    The false negative area is the area above the candidate probability
+    curve for distances up to `radius` and the false positive area is
+    the area under the curve from `radius` to `max_distance`, both
+    measured in units of `radius`.
+
+    Parameters
+    ----------
+    radius : float
+        target Euclidean distance below which points should be
+        candidates
+    signature_size : int
+        number of projections of each signature
+    max_distance : float, default=None
+        largest distance considered for the false positives. If None,
+        this defaults to 3 * radius.
+    widths : iterable of float, default=None
+        bucket widths to consider. If None, 0.5 to 8 times `radius` in
+        steps of 0.25 times `radius`.
+    false_positive_weight : float, default=0.5
+        weight of the false positive area
+    false_negative_weight : float, default=0.5
+        weight of the false negative area
+
+    Returns
+    -------
+    w, bands, r : tuple
+        optimal bucket width, number of bands and rows per band
+    """
+    if max_distance is None:
+        max_distance = 3 * radius
+    if widths is None:
+        widths = radius * np.arange(0.5, 8.01, 0.25)
+
+    best, best_error = None, np.inf
+    for w in widths:
+        for bands in range(1, signature_size + 1):
+            if signature_size % bands:
+                continue
+            r = signature_size // bands
+            prob = lambda d: pstable_candidate_prob(d, w, bands, r)
+            false_negative = quad(lambda d: 1 - prob(d), 0, radius)[0]
+            false_positive = quad(prob, radius, max_distance)[0]
+            error = (false_positive_weight * false_positive
+                     + false_negative_weight * false_negative) / radius
+            if error < best_error:
+                best, best_error = (float(w), bands, r), error
+    return best
+
+
+def plot_pstable_thresh(w, bands, r, radius=None, max_distance=None,
+                        ax=None, **kwargs):
+    """Plots the candidate probability of a p-stable LSH index against
+    the Euclidean distance of two points.
+
+    Parameters
+    ----------
+    w : float
+        bucket width of the projections
+    bands : int
+        number of bands
+    r : int
+        number of rows per band
+    radius : float, default=None
+        target distance to emphasize. If None, nothing is emphasized.
+    max_distance : float, default=None
+        largest distance plotted. If None, this defaults to 3 * radius,
+        or 3 * w if radius is not given.
+    ax : matplotlib.pyplot Axis, default=None
+        Axis for plotting. If None, use internally generated Axis object.
+    **kwargs : keyword arguments for the matplotlib.pyplot.plot() function.
+
+    Returns
+    -------
+    ax : matplotlib.pyplot Axis object
+    """
+    if max_distance is None:
+        max_distance = 3 * (radius if radius is not None else w)
+    d_list = np.linspace(0, max_distance, num=50)
+    p_list = pstable_candidate_prob(d_list, w, bands, r)
+
+    if ax is None:
+        fig, ax = plt.subplots(figsize=(8, 5))
+
+    ax.plot(d_list, p_list, **kwargs)
+    if radius is not None:
+        ax.axvline(radius, color='black', linestyle='--',
+                   label=f'Target Distance: {radius:.2f}')
+        ax.legend(fontsize=13)
+
+    ax.set_title('Probability of becoming a candidate given a distance',
+                 fontsize=15)
+    ax.set_ylabel('Probability', fontsize=13)
+    ax.set_xlabel('Euclidean Distance of Points', fontsize=13)
+
+    # Hide the right and top spines
+    ax.spines['right'].set_visible(False)
+    ax.spines['top'].set_visible(False)
+
+    # set spines lw
+    ax.spines['left'].set_linewidth(3)
+    ax.spines['bottom'].set_linewidth(3)
+    return ax
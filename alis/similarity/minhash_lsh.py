@@ -3,18 +3,32 @@ The traditional LSH appraoch to a hypothetical many-to-many document similarity
 The objective is to bucket similar documents together. The implementation is done through 
 the `LSH` class which leverages on `dask.bag` functionality and methods to 
 parallelize the banding technique. Specifically, the map (hash function) and reduce 
-(bucketing) tasks.
+(bucketing) tasks. Signature matrices that fit in memory can instead be banded 
+with the vectorized numpy backend (`backend='numpy'`).
 
 Note: importing the model automatically initializes a dask client.
 
 BY: Mike Dorosan, 2022
 """
 
+import json
+import os
+
 import dask.bag as db
 
 import numpy as np
 import matplotlib.pyplot as plt
 
+from ._banding import BandBuckets, band_keys, bucket_pairs, unpack_pairs
+from ._hamming import angular_sim
+from ._jaccard import bbit_jaccard_sim, jaccard_sim_pairs
+from ._tuning import prob_of_candidate
+from ..feature_extraction._hashing import sorted_unique
+from ..feature_extraction.minhash import pack_bits
+
+# version of the directory layout written by `LSH.save`
+_FORMAT_VERSION = 2
+
 
 class LSH():
     """The LSH class for a many-to-many document similarity task.
@@ -33,27 +47,48 @@ class LSH():
     band_dict : dict
         dictionary with band labels as keys and 
         (set/doc index, signature band) tuples as values  
-    band_buckets : dict
+    band_buckets : dict or BandBuckets
         a dictionary with hash bucket as keys and a list of similar 
-        document indices as values
+        document indices as values. With the numpy backend, the buckets
+        of all bands stored as flat arrays.
+    backend : str
+        'dask' or 'numpy'
+    ids_ : np.array or None
+        document identifiers of the signature rows when a dask.bag was
+        given to the numpy backend
     Methods
     -------
 
     """
 
-    def __init__(self, signature):
+    def __init__(self, signature, backend='dask'):
         """Initialize class
 
         Parameters
         ----------
         signature : 2-D np.array, or dask.bag 
             document minhash signatures with dimension n (samples) by m (signature size)
-            dask.bag of tuples (set/doc index, )
+            dask.bag of tuples (set/doc index, signature), or dask.bag of
+            (doc indices, signature block) tuples as returned by
+            `MinhashLSH.transform_partitions`
+        backend : {'dask', 'numpy'}, default='dask'
+            'dask' bands and buckets the signatures with `dask.bag`.
+            'numpy' keeps the signature matrix in memory and buckets it
+            with vectorized hashing and sorting; a dask.bag signature
+            is computed into a matrix and its identifiers are kept in
+            `ids_`.
         """
+        if backend not in ('dask', 'numpy'):
+            raise ValueError("backend should be either 'dask' or 'numpy'")
+        self.backend = backend
+        self.ids_ = None
+        if backend == 'numpy' and type(signature) == db.core.Bag:
+            self.ids_, signature = _collect_signatures(signature)
         self.signature = signature
         self.bands = None  # number of bands
         self.r = None  # rows per band, band size
         self.hash_functions = None
+        self._is_block = False  # signature bag of (ids, signatures) blocks
         self.band_dict = {}
         self.band_buckets = {}
 
@@ -76,14 +111,35 @@ class LSH():
 
         self.bands = bands
         
-        if type(self.signature) == db.core.Bag:
-            signature_size = len(self.signature.take(1)[0][1]) # get size of signature
+        if self.backend == 'numpy':
+            signature_size = self.signature.shape[1]
+            assert signature_size % self.bands == 0, "Number of bands not a factor of signature size."
+            self.r = int(signature_size / self.bands)
+
+            # views of the signature matrix
+            self.band_dict = {
+                band_label: self.signature[:, i:i+self.r]
+                for band_label, i in enumerate(
+                    range(0, signature_size, self.r))
+            }
+
+        elif type(self.signature) == db.core.Bag:
+            first_signature = self.signature.take(1)[0][1]
+            is_block = self._is_block = np.ndim(first_signature) == 2
+            signature_size = np.shape(first_signature)[-1] # get size of signature
             assert signature_size % self.bands == 0, "Number of bands not a factor of signature size."
             self.r = int(signature_size / self.bands)
             
             for band_label, i in enumerate(range(0, signature_size, self.r)):
-                band_bag = self.signature.map(lambda x: (x[0], np.array(x[1][i:i+self.r]))).repartition(1)
-                self.band_dict[band_label] = band_bag
+                if is_block:
+                    # (ids, signatures) blocks from
+                    # MinhashLSH.transform_partitions
+                    band_bag = self.signature.map_partitions(
+                        _band_slices, start=i, stop=i+self.r)
+                else:
+                    band_bag = self.signature.map(
+                        lambda x, i=i: (x[0], np.array(x[1][i:i+self.r])))
+                self.band_dict[band_label] = band_bag.repartition(1)
             
         elif type(self.signature) == np.ndarray:
             # check if number of bands divide columns equally
@@ -94,7 +150,7 @@ class LSH():
 
             for band_label, i in enumerate(range(0, signature_size, self.r)):
                 band_bag = db.from_sequence(
-                    zip(range(signature_size),
+                    zip(range(self.signature.shape[0]),
                         self.signature[:, i:i+self.r]), npartitions=1)
                 self.band_dict[band_label] = band_bag
                 
@@ -116,12 +172,26 @@ class LSH():
             a list of hash functions with size equivalent to the number of 
             bands. If None, the native python hash function is applied.
 
+        With the numpy backend, the bands of all documents are hashed at
+        once into 64-bit keys and grouped by sorting the keys. Signature
+        blocks from `MinhashLSH.transform_partitions` are likewise hashed
+        one block at a time with these keys when `hash_functions` is None.
+
         Returns
         -------
-        band_buckets - dict 
+        band_buckets - dict or BandBuckets
             a dictionary with hash bucket as keys and a list of similar 
-            document indices as values    
+            document indices as values. With the numpy backend, a
+            `BandBuckets` holding the sorted bucket keys, bucket offsets
+            and the signature row indices of all bands.
         """
+        if self.backend == 'numpy':
+            if hash_functions is not None:
+                raise ValueError(
+                    "Custom hash functions are not supported by the numpy backend")
+            self.band_buckets = BandBuckets.from_signature(
+                self.signature, self.bands)
+            return self.band_buckets
 
         self.hash_functions = hash_functions
         if not hash_functions:
@@ -134,13 +204,21 @@ class LSH():
                 idx = index
             else:
                 idx = 0
-            self.band_buckets[key] = (
-                value.map(
-                    lambda x: (
+            if self._is_block and not hash_functions:
+                # hash the bands of each block at once with `band_keys`
+                # instead of one python hash call per document
+                hashed = self.signature.map_partitions(
+                    _band_key_slices, start=index * self.r,
+                    stop=(index + 1) * self.r).repartition(1)
+            else:
+                hashed = value.map(
+                    lambda x, idx=idx: (
                         x[0],
                         self.hash_functions[idx](x[1].tobytes())
                     )
                 )
+            self.band_buckets[key] = (
+                hashed
                 .groupby(lambda x: x[1])  # groupby hash value
                 # get only document index
                 .map(lambda x: (x[0], list(list(zip(*x[1]))[0])))
@@ -150,9 +228,241 @@ class LSH():
 
         return self.band_buckets
 
+    def candidate_pairs(self, max_bucket_size=None):
+        """Return the distinct pairs of documents that share a bucket in
+        at least one band. Must be called after `get_buckets`.
+
+        The pairs of each bucket are packed into uint64 words and
+        deduplicated across bands by sorting.
+
+        Parameters
+        ----------
+        max_bucket_size : int, default=None
+            buckets with more documents than this are skipped, which
+            avoids the quadratic blow-up of degenerate buckets. If None,
+            all buckets are expanded.
+
+        Returns
+        -------
+        pairs : np.array of shape (num_pairs, 2)
+            candidate pairs of document identifiers (signature row
+            indices for a signature matrix). Both backends return the
+            smaller identifier of each pair first and sort the pairs
+            by identifier.
+        """
+        if self.backend == 'numpy':
+            pairs = self.band_buckets.candidate_pairs(max_bucket_size)
+            ids = self.ids_
+        else:
+            ids, codes = None, {}
+            packed = []
+            for buckets in self.band_buckets.values():
+                if type(buckets) == db.core.Bag:
+                    buckets = buckets.compute()
+                doc_ids = [codes.setdefault(doc_id, len(codes))
+                           for _, docs in buckets for doc_id in docs]
+                offsets = np.cumsum([0] + [len(docs) for _, docs in buckets])
+                packed.append(bucket_pairs(doc_ids, offsets, max_bucket_size))
+            pairs = unpack_pairs(
+                sorted_unique(np.concatenate(packed)) if packed else [])
+            ids = np.array(list(codes))
+
+        if ids is None:
+            return pairs
+        return _pairs_by_identifier(pairs, ids)
+
+    def verify_candidates(self, pairs=None, threshold=None,
+                          method='signature', characteristic_matrix=None,
+                          max_bucket_size=None, batch_size=2**16,
+                          num_bits=8):
+        """Yield the candidate pairs whose similarity is at least
+        `threshold`, one batch at a time
+
+        Parameters
+        ----------
+        pairs : np.array of shape (num_pairs, 2), default=None
+            candidate pairs of document identifiers. If None, the output
+            of `candidate_pairs(max_bucket_size)` is used.
+        threshold : float, default=None
+            minimum similarity of the pairs to keep. If None, the
+            approximate similarity threshold of the chosen b and r is
+            used.
+        method : {'signature', 'bbit', 'hamming', 'jaccard'}, \
+default='signature'
+            'signature' estimates the similarity by the fraction of
+            agreeing signature values; 'bbit' does the same on the
+            lowest `num_bits` bits of the values, packed into words and
+            compared with `bbit_jaccard_sim`; 'hamming' packs 0/1
+            signatures such as unpacked SimHash bits and returns the
+            fraction of equal bits via `angular_sim`; 'jaccard' computes
+            the exact Jaccard similarity from `characteristic_matrix`.
+        characteristic_matrix : scipy.sparse matrix, default=None
+            matrix of shape (n, num_items) whose rows are the shingle
+            sets of the documents in signature order, e.g., the output
+            of `characteristic_matrix`. Required by method='jaccard'.
+        max_bucket_size : int, default=None
+            passed to `candidate_pairs` when `pairs` is None
+        batch_size : int, default=65536
+            number of candidate pairs verified per batch
+        num_bits : {1, 2, 4, 8}, default=8
+            number of bits per signature value used by method='bbit'
+
+        Yields
+        ------
+        pairs, similarities : tuple of np.array
+            verified pairs of the batch of shape (num_verified, 2) and
+            their similarities
+        """
+        if method not in ('signature', 'bbit', 'hamming', 'jaccard'):
+            raise ValueError("method should be one of 'signature', 'bbit', "
+                             "'hamming' or 'jaccard'")
+        if method == 'jaccard' and characteristic_matrix is None:
+            raise ValueError("method='jaccard' requires characteristic_matrix")
+        if pairs is None:
+            pairs = self.candidate_pairs(max_bucket_size)
+        if threshold is None:
+            threshold = self._get_approx_thresh()
+
+        ids, signature = self._signature_matrix()
+        pairs = np.asarray(pairs).reshape(-1, 2)
+        if ids is None:
+            rows = pairs.astype(np.int64)
+        else:
+            # map identifiers to signature rows
+            order = np.argsort(ids)
+            rows = order[np.searchsorted(ids, pairs, sorter=order)]
+        if method == 'bbit':
+            packed = pack_bits(signature, num_bits)
+        elif method == 'hamming':
+            packed = pack_bits(signature, 1)
+
+        for start in range(0, len(pairs), batch_size):
+            batch = rows[start:start + batch_size]
+            if method == 'signature':
+                sims = (signature[batch[:, 0]] == signature[batch[:, 1]]
+                        ).mean(axis=1)
+            elif method == 'bbit':
+                sims = bbit_jaccard_sim(packed[batch[:, 0]],
+                                        packed[batch[:, 1]], num_bits,
+                                        signature.shape[1])
+            elif method == 'hamming':
+                sims = angular_sim(packed[batch[:, 0]], packed[batch[:, 1]],
+                                   signature.shape[1])
+            else:
+                sims = jaccard_sim_pairs(characteristic_matrix, batch)
+            keep = sims >= threshold
+            yield pairs[start:start + batch_size][keep], sims[keep]
+
+    def query(self, signature):
+        """Return the documents sharing a bucket with the given signature
+        in at least one band. Requires the numpy backend.
+
+        Parameters
+        ----------
+        signature : 1-D np.array
+            signature of the query document
+
+        Returns
+        -------
+        candidates : np.array
+            identifiers of the candidate documents (signature row
+            indices for a signature matrix)
+        """
+        if self.backend != 'numpy':
+            raise ValueError("query requires the numpy backend")
+        rows = self.band_buckets.lookup(band_keys(signature, self.bands)[0])
+        return rows if self.ids_ is None else self.ids_[rows]
+
+    def save(self, path, include_signature=False):
+        """Save the buckets of the index to the directory `path`.
+        Requires the numpy backend and a prior call to `get_buckets`.
+
+        Each array of the buckets is written to its own `.npy` file,
+        along with the document identifiers and a `meta.json` holding
+        the format version, the number of bands and rows and the names
+        of the optional arrays that were written. Optional arrays left
+        in `path` by an earlier save are removed.
+
+        Parameters
+        ----------
+        path : str
+            directory in which to save the index
+        include_signature : bool, default=False
+            whether to also save the signature matrix, which is needed
+            by `verify_candidates` with method='signature' after loading
+        """
+        if self.backend != 'numpy' or not isinstance(self.band_buckets, BandBuckets):
+            raise ValueError(
+                "Only a numpy backend LSH with buckets can be saved")
+        arrays = {}
+        if self.ids_ is not None:
+            arrays['ids'] = self.ids_
+        if include_signature:
+            arrays['signature'] = np.asarray(self.signature)
+
+        self.band_buckets.save(path)
+        for name in ('ids', 'signature'):
+            filename = os.path.join(path, f'{name}.npy')
+            if name in arrays:
+                np.save(filename, arrays[name], allow_pickle=False)
+            elif os.path.exists(filename):
+                os.remove(filename)
+        with open(os.path.join(path, 'meta.json'), 'w') as f:
+            json.dump({'format_version': _FORMAT_VERSION, 'bands': self.bands,
+                       'r': self.r, 'arrays': sorted(arrays)}, f)
+
+    @classmethod
+    def load(cls, path, mmap=True):
+        """Return the index saved in the directory `path` by `save`
+
+        Parameters
+        ----------
+        path : str
+            directory of the saved index
+        mmap : bool, default=True
+            whether to memory-map the arrays instead of reading them, so
+            that loading takes constant time and several processes share
+            the same pages
+
+        Returns
+        -------
+        lsh : LSH
+            numpy backend LSH ready for `query` and `candidate_pairs`.
+            Its signature is None unless it was saved.
+        """
+        mmap_mode = 'r' if mmap else None
+        with open(os.path.join(path, 'meta.json')) as f:
+            meta = json.load(f)
+        if meta.get('format_version') != _FORMAT_VERSION:
+            raise ValueError(
+                f"Unsupported index format version "
+                f"{meta.get('format_version')}, expected {_FORMAT_VERSION}")
+
+        def load_array(name):
+            if name not in meta['arrays']:
+                return None
+            return np.load(os.path.join(path, f'{name}.npy'),
+                           mmap_mode=mmap_mode, allow_pickle=False)
+
+        lsh = cls(load_array('signature'), backend='numpy')
+        lsh.bands = meta['bands']
+        lsh.r = meta['r']
+        lsh.ids_ = load_array('ids')
+        lsh.band_buckets = BandBuckets.load(path, mmap=mmap)
+        return lsh
+
+    def _signature_matrix(self):
+        """Return the document identifiers (None for row indices) and the
+        signature matrix"""
+        if type(self.signature) == db.core.Bag:
+            if getattr(self, '_collected', None) is None:
+                self._collected = _collect_signatures(self.signature)
+            return self._collected
+        return self.ids_, self.signature
+
     def _prob_of_s(self, s):
         """Return the probability of similarity s given b and r"""
-        return 1 - (1 - s**self.r)**self.bands
+        return prob_of_candidate(s, self.bands, self.r)
 
     def _get_approx_thresh(self):
         """Return approximate similarity threshold for chosen b and r"""
@@ -207,4 +517,49 @@ class LSH():
         if return_thresh:
             return self.ax_, thresh
         return self.ax_
-    
+
+
+def _pairs_by_identifier(pairs, ids):
+    """Return the identifiers of the given pairs of indices into `ids`,
+    with the smaller identifier of each pair first and the pairs sorted
+    by identifier"""
+    order = np.argsort(ids, kind='stable')
+    rank = np.empty(len(ids), dtype=np.int64)
+    rank[order] = np.arange(len(ids))
+    pairs = np.sort(rank[pairs], axis=1).reshape(-1, 2)
+    pairs = pairs[np.lexsort((pairs[:, 1], pairs[:, 0]))]
+    return ids[order][pairs].reshape(-1, 2)
+
+
+def _band_slices(blocks, start, stop):
+    """Return the (set/doc index, signature band) tuples of a partition
+    of (doc indices, signature block) tuples"""
+    return [(doc_id, band)
+            for ids, signatures in blocks
+            for doc_id, band in zip(ids.tolist(), signatures[:, start:stop])]
+
+
+def _band_key_slices(blocks, start, stop):
+    """Return the (set/doc index, bucket key) tuples of a signature band
+    of a partition of (doc indices, signature block) tuples"""
+    return [(doc_id, key)
+            for ids, signatures in blocks
+            for doc_id, key in zip(
+                ids.tolist(),
+                band_keys(signatures[:, start:stop], 1)[:, 0].tolist())]
+
+
+def _collect_signatures(db_signature):
+    """Return the identifiers and signature matrix of a dask.bag of
+    (set/doc index, signature) tuples or (doc indices, signature block)
+    tuples"""
+    first_signature = db_signature.take(1)[0][1]
+    if np.ndim(first_signature) == 2:
+        blocks = db_signature.compute()
+        ids = np.concatenate([ids for ids, _ in blocks])
+        signature = np.vstack([signatures for _, signatures in blocks])
+    else:
+        rows = db_signature.compute()
+        ids = np.array([doc_id for doc_id, _ in rows])
+        signature = np.array([row for _, row in rows])
+    return ids, signature
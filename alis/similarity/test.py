@@ -0,0 +1,432 @@
+import os
+import tempfile
+import unittest
+import dask
+import dask.bag as db
+import numpy as np
+from numpy.testing import assert_almost_equal, assert_array_equal
+from alis.feature_extraction import *
+from alis.similarity import *
+
+
+class CharacteristicMatrixTests(unittest.TestCase):
+
+    def test_small_ids(self):
+        sets = [{0, 1, 2}, {1, 2, 3}, {5}]
+        matrix = characteristic_matrix(sets, num_items=6)
+        self.assertEqual(matrix.shape, (3, 6))
+        assert_array_equal(matrix.toarray()[2], [0, 0, 0, 0, 0, 1])
+        assert_almost_equal(jaccard_sim_pairs(matrix, [(0, 1)]), [0.5])
+        with self.assertRaises(ValueError):
+            characteristic_matrix(sets, num_items=5)
+
+    def test_64_bit_ids(self):
+        sets = [rolling_shingles('the quick brown fox', 4),
+                rolling_shingles('the quick brown dog', 4),
+                rolling_shingles('lorem ipsum dolor', 4)]
+        self.assertTrue(any(s.max() >= 2**63 for s in sets))
+
+        matrix = characteristic_matrix(sets)
+        matrix.check_format(full_check=True)
+        num_distinct = len(set().union(*(s.tolist() for s in sets)))
+        self.assertEqual(matrix.shape, (3, num_distinct))
+
+        first, second = set(sets[0].tolist()), set(sets[1].tolist())
+        expected = len(first & second) / len(first | second)
+        sims = jaccard_sim_matrix(matrix)
+        assert_almost_equal(sims[0, 1], expected)
+        assert_almost_equal(np.diag(sims), [1, 1, 1])
+
+
+def _signature_matrix(n_docs=40, num_hash=32, seed=0):
+    """Return signatures of random documents with near-duplicate pairs"""
+    rng = np.random.default_rng(seed)
+    signature = rng.integers(0, 2**32, size=(n_docs, num_hash),
+                             dtype=np.uint64)
+    signature[1::2] = signature[::2]
+    signature[1::4, :num_hash // 2] += 1
+    return signature
+
+
+class BandBucketsTests(unittest.TestCase):
+
+    def test_from_signature(self):
+        signature = _signature_matrix(n_docs=8)
+        buckets = BandBuckets.from_signature(signature, 8)
+        self.assertEqual((buckets.bands, buckets.n_docs), (8, 8))
+        keys = band_keys(signature, 8)
+        for row in range(8):
+            first = row - row % 2
+            assert_array_equal(buckets.lookup(keys[row]), [first, first + 1])
+
+        # rows 1 and 5 only agree with rows 0 and 4 on the last 4 bands
+        _, offsets, doc_ids = buckets.band(0)
+        self.assertEqual(sorted(np.diff(offsets).tolist()),
+                         [1, 1, 1, 1, 2, 2])
+        _, offsets, doc_ids = buckets.band(7)
+        assert_array_equal(np.diff(offsets), [2, 2, 2, 2])
+        self.assertEqual(sorted(doc_ids.tolist()), list(range(8)))
+
+        lsh = LSH(signature, backend='numpy')
+        lsh.make_bands(8)
+        lsh.get_buckets()
+        for name in ['keys', 'offsets', 'doc_ids', 'band_ptr']:
+            assert_array_equal(getattr(lsh.band_buckets, name),
+                               getattr(buckets, name))
+
+
+class BucketPairTests(unittest.TestCase):
+
+    def test_expansion(self):
+        doc_ids = [0, 3, 5, 2, 7, 3, 0]
+        offsets = [0, 3, 4, 7]
+        packed = bucket_pairs(doc_ids, offsets)
+        expected = {(0, 3), (0, 5), (3, 5), (0, 7), (3, 7)}
+        self.assertEqual(set(map(tuple, unpack_pairs(packed).tolist())),
+                         expected)
+        self.assertTrue(np.all(np.diff(packed.astype(np.float64)) > 0))
+        self.assertEqual(len(bucket_pairs(doc_ids, offsets, 2)), 0)
+
+
+class LSHTests(unittest.TestCase):
+
+    def test_backends_agree(self):
+        signature = _signature_matrix()
+        lsh = LSH(signature, backend='numpy')
+        lsh.make_bands(8)
+        lsh.get_buckets()
+        expected = lsh.candidate_pairs()
+        self.assertGreater(len(expected), 0)
+
+        with dask.config.set(scheduler='synchronous'):
+            lsh = LSH(signature)
+            lsh.make_bands(8)
+            lsh.get_buckets()
+            pairs = lsh.candidate_pairs()
+        assert_array_equal(pairs, expected)
+
+    def test_backends_agree_on_ids(self):
+        signature = _signature_matrix()
+        ids = np.arange(len(signature))[::-1] * 10
+        with dask.config.set(scheduler='synchronous'):
+            bag = db.from_sequence(list(zip(ids, signature)), npartitions=3)
+            numpy_lsh = LSH(bag, backend='numpy')
+            numpy_lsh.make_bands(8)
+            numpy_lsh.get_buckets()
+            dask_lsh = LSH(bag)
+            dask_lsh.make_bands(8)
+            dask_lsh.get_buckets()
+            dask_pairs = dask_lsh.candidate_pairs()
+        numpy_pairs = numpy_lsh.candidate_pairs()
+        self.assertGreater(len(numpy_pairs), 0)
+        assert_array_equal(numpy_pairs, dask_pairs)
+        self.assertTrue(np.all(numpy_pairs[:, 0] < numpy_pairs[:, 1]))
+
+    def test_signature_blocks(self):
+        signature = _signature_matrix()
+        # split some duplicates on the last row of every band only
+        signature[2::8, 3::4] += 1
+        ids = np.arange(len(signature))[::-1] * 10
+        blocks = [(ids[i:i + 7], signature[i:i + 7])
+                  for i in range(0, len(signature), 7)]
+        with dask.config.set(scheduler='synchronous'):
+            rows = db.from_sequence(list(zip(ids, signature)), npartitions=3)
+            reference = LSH(rows)
+            reference.make_bands(8)
+            reference.get_buckets()
+            expected = reference.candidate_pairs()
+            bag = db.from_sequence(blocks, npartitions=2)
+            for backend in ['numpy', 'dask']:
+                lsh = LSH(bag, backend=backend)
+                lsh.make_bands(8)
+                lsh.get_buckets()
+                assert_array_equal(lsh.candidate_pairs(), expected)
+            # blocks hashed with band keys group documents the same way
+            for band in range(8):
+                self.assertEqual(
+                    sorted(sorted(docs) for _, docs
+                           in lsh.band_buckets[band].compute()),
+                    sorted(sorted(docs) for _, docs
+                           in reference.band_buckets[band].compute()))
+            # bands of blocks are still exposed per document, and custom
+            # hash functions are applied to them
+            band = lsh.band_dict[1].compute()
+            self.assertEqual([doc_id for doc_id, _ in band], ids.tolist())
+            assert_array_equal(np.vstack([b for _, b in band]),
+                               signature[:, 4:8])
+            lsh.get_buckets(hash_functions=[lambda x: hash(x) % 7])
+            self.assertTrue(all(
+                0 <= key < 7 for key, _ in lsh.band_buckets[0].compute()))
+        self.assertGreater(len(expected), 0)
+
+    def test_save_load(self):
+        signature = _signature_matrix()
+        lsh = LSH(signature, backend='numpy')
+        lsh.make_bands(8)
+        lsh.get_buckets()
+        with tempfile.TemporaryDirectory() as path:
+            lsh.save(path, include_signature=True)
+            for mmap in [True, False]:
+                loaded = LSH.load(path, mmap=mmap)
+                self.assertEqual((loaded.bands, loaded.r), (8, 4))
+                self.assertIsNone(loaded.ids_)
+                assert_array_equal(loaded.signature, signature)
+                assert_array_equal(loaded.candidate_pairs(),
+                                   lsh.candidate_pairs())
+                assert_array_equal(loaded.query(signature[3]),
+                                   lsh.query(signature[3]))
+                del loaded
+        ids = np.arange(len(signature)) + 100
+        lsh.ids_ = ids
+        with tempfile.TemporaryDirectory() as path:
+            lsh.save(path)
+            self.assertFalse(os.path.exists(
+                os.path.join(path, 'signature.npy')))
+            loaded = LSH.load(path, mmap=False)
+            self.assertIsNone(loaded.signature)
+            assert_array_equal(loaded.ids_, ids)
+            assert_array_equal(loaded.candidate_pairs(),
+                               lsh.candidate_pairs())
+
+            # saving over an index drops the arrays it no longer has
+            lsh.save(path, include_signature=True)
+            lsh.ids_ = None
+            lsh.save(path)
+            self.assertEqual(sorted(os.listdir(path)), [
+                'band_ptr.npy', 'doc_ids.npy', 'keys.npy', 'meta.json',
+                'offsets.npy'])
+            loaded = LSH.load(path, mmap=False)
+            self.assertIsNone(loaded.ids_)
+            self.assertIsNone(loaded.signature)
+
+            with open(os.path.join(path, 'meta.json'), 'w') as f:
+                f.write('{"format_version": 1, "bands": 8, "r": 4}')
+            with self.assertRaises(ValueError):
+                LSH.load(path)
+
+
+def _similar_pairs(n_pairs, num_hash=64, seed=0):
+    """Return signatures of `n_pairs` document pairs whose similarities
+    are uniform between 0.3 and 1, the second documents of the pairs
+    following the first ones"""
+    rng = np.random.default_rng(seed)
+    first = rng.integers(0, 2**32, size=(n_pairs, num_hash), dtype=np.uint64)
+    second = first.copy()
+    sims = rng.uniform(0.3, 1, size=n_pairs)
+    change = rng.random((n_pairs, num_hash)) >= sims[:, None]
+    second[change] = rng.integers(0, 2**32, size=change.sum(),
+                                  dtype=np.uint64)
+    return np.vstack([first, second])
+
+
+class LSHForestTests(unittest.TestCase):
+
+    def setUp(self):
+        query = np.arange(1, 9, dtype=np.uint64)
+        # documents sharing prefixes of length 8, 5, 2 and 0 with query
+        self.signature = np.array([query] * 4)
+        self.signature[1, 5:] += 100
+        self.signature[2, 2:] += 100
+        self.signature[3] += 100
+        self.query = query
+        self.forest = LSHForest(1, 8).fit(self.signature)
+
+    def test_query_by_prefix_length(self):
+        expected = [[0], [0, 1], [0, 1, 2], [0, 1, 2]]
+        for num_candidates, rows in zip([1, 2, 3, 10], expected):
+            assert_array_equal(
+                self.forest.query(self.query, num_candidates), rows)
+
+        forest = LSHForest(1, 8).fit(self.signature, ids=list('abcd'))
+        assert_array_equal(forest.query(self.query, 2), ['a', 'b'])
+
+    def test_min_depth(self):
+        assert_array_equal(self.forest.query(self.query, 10, min_depth=3),
+                           [0, 1])
+        assert_array_equal(self.forest.query(self.query, 10, min_depth=0),
+                           [0, 1, 2, 3])
+        assert_array_equal(self.forest.query(self.query + 100, 10), [3])
+        self.assertEqual(len(self.forest.query(self.query + 1, 10)), 0)
+
+    def test_empty_index(self):
+        forest = LSHForest(2, 4).fit(np.empty((0, 8), dtype=np.uint64))
+        self.assertEqual(len(forest.query(self.query)), 0)
+        forest = LSHForest(2, 4).fit(np.empty((0, 8), dtype=np.uint64),
+                                     ids=[])
+        self.assertEqual(len(forest.query(self.query)), 0)
+
+    def test_recall(self):
+        signature = _similar_pairs(500)
+        forest = LSHForest(4, 16).fit(signature)
+        queries = np.arange(0, 1000, 5)
+        self.assertGreaterEqual(
+            forest.empirical_recall(signature, queries, 0.6), 0.95)
+
+        # matching whole prefixes only is banding with `depth` rows, whose
+        # recall follows the analytic candidate probability
+        forest = LSHForest(4, 4).fit(signature)
+        sims = (signature[:500] == signature[500:]).mean(axis=1)
+        expected = forest._prob_of_s(sims[sims >= 0.6]).mean()
+        recall = forest.empirical_recall(signature, np.arange(500), 0.6,
+                                         num_candidates=1, min_depth=4)
+        self.assertAlmostEqual(recall, expected, delta=0.05)
+        self.assertAlmostEqual(forest._prob_of_s(1), 1)
+        self.assertAlmostEqual(forest._prob_of_s(0.5, depth=1), 1 - 0.5**4)
+
+
+class HammingTests(unittest.TestCase):
+
+    def test_angular_sim(self):
+        rng = np.random.default_rng(0)
+        x = rng.standard_normal(50)
+        y = x + rng.standard_normal(50)
+        theta = np.arccos(x @ y / np.linalg.norm(x) / np.linalg.norm(y))
+        signatures = simhash_signatures(np.array([x, y]), 4096)
+        self.assertEqual(hamming_distance(signatures[0], signatures[0]), 0)
+        self.assertAlmostEqual(
+            angular_sim(signatures[0], signatures[1], 4096),
+            1 - theta / np.pi, delta=0.03)
+        assert_array_equal(hamming_distance(signatures, ~signatures),
+                           [64 * 64, 64 * 64])
+
+    def test_verify_candidates(self):
+        rng = np.random.default_rng(0)
+        X = rng.standard_normal((20, 30))
+        X[1::2] = X[::2] + 0.1 * rng.standard_normal((10, 30))
+        bits = simhash_signatures(X, 64, packed=False)
+        lsh = LSH(bits, backend='numpy')
+        lsh.make_bands(8)
+        lsh.get_buckets()
+        pairs = lsh.candidate_pairs()
+        verified, sims = zip(*lsh.verify_candidates(method='hamming',
+                                                    threshold=0.9))
+        verified, sims = np.vstack(verified), np.concatenate(sims)
+        self.assertTrue({(i, i + 1) for i in range(0, 20, 2)}
+                        <= set(map(tuple, verified.tolist())))
+        packed = pack_bits(bits, 1)
+        assert_almost_equal(
+            sims, angular_sim(packed[verified[:, 0]], packed[verified[:, 1]],
+                              64))
+        self.assertTrue(np.all(sims >= 0.9))
+        self.assertLessEqual(len(verified), len(pairs))
+
+
+class TuningTests(unittest.TestCase):
+
+    def test_optimal_bands(self):
+        for signature_size in [12, 32, 60]:
+            for threshold in [0.3, 0.5, 0.8]:
+                bands, r = optimal_bands(threshold, signature_size)
+                self.assertEqual(bands * r, signature_size)
+
+        # penalizing false positives favors fewer, longer bands
+        for threshold in [0.3, 0.5, 0.8]:
+            fewer_fp, _ = optimal_bands(threshold, 64, 0.9, 0.1)
+            balanced, _ = optimal_bands(threshold, 64)
+            fewer_fn, _ = optimal_bands(threshold, 64, 0.1, 0.9)
+            self.assertLessEqual(fewer_fp, balanced)
+            self.assertLessEqual(balanced, fewer_fn)
+            self.assertLess(fewer_fp, fewer_fn)
+
+    def test_max_memory(self):
+        sample = _signature_matrix(n_docs=100)
+        bands, _ = optimal_bands(0.5, 32, sample=sample)
+        self.assertEqual(bands, 8)
+        costs = {b: estimate_index_cost(sample, b, n_docs=10**6)
+                 for b in [1, 2, 4, 8, 16, 32]}
+        budget = costs[4]['index_bytes'] + costs[4]['build_bytes']
+        bands, r = optimal_bands(0.5, 32, sample=sample, n_docs=10**6,
+                                 max_memory=budget)
+        self.assertEqual((bands, r), (4, 8))
+        with self.assertRaises(ValueError):
+            optimal_bands(0.5, 32, sample=sample, n_docs=10**6,
+                          max_memory=budget / 10)
+
+    def test_index_cost(self):
+        sample = _signature_matrix(n_docs=100)
+        sample[::3, :8] = sample[0, :8]
+        lsh = LSH(sample, backend='numpy')
+        lsh.make_bands(8)
+        buckets = lsh.get_buckets()
+        cost = estimate_index_cost(sample, 8)
+        for value in cost.values():
+            self.assertIs(type(value), float)
+        sizes = buckets.bucket_sizes()
+        self.assertEqual(cost['candidate_pairs'], len(lsh.candidate_pairs()))
+        self.assertEqual(cost['bucket_pairs'],
+                         (sizes * (sizes - 1) // 2).sum())
+        self.assertEqual(cost['index_bytes'], sum(
+            getattr(buckets, name).nbytes
+            for name in ['keys', 'offsets', 'doc_ids', 'band_ptr']))
+
+        scaled = estimate_index_cost(sample, 8, n_docs=1000)
+        self.assertAlmostEqual(scaled['candidate_pairs'],
+                               cost['candidate_pairs'] * 1000 * 999 / 9900)
+        self.assertEqual(scaled['build_bytes'], cost['build_bytes'] * 10)
+
+
+class PStableTuningTests(unittest.TestCase):
+
+    def test_collision_prob(self):
+        self.assertEqual(pstable_collision_prob(0, 1.0), 1.0)
+        probs = pstable_collision_prob(np.linspace(0, 5, 51), 1.0)
+        self.assertEqual(probs[0], 1.0)
+        self.assertTrue(np.all(np.diff(probs) < 0))
+        self.assertTrue(np.all((probs > 0) & (probs <= 1)))
+        # the probability only depends on w / distance
+        self.assertAlmostEqual(pstable_collision_prob(2.0, 4.0),
+                               pstable_collision_prob(1.0, 2.0))
+
+    def test_optimal_bands(self):
+        for signature_size in [12, 32]:
+            w, bands, r = optimal_pstable_bands(1.0, signature_size)
+            self.assertEqual(bands * r, signature_size)
+            self.assertIsInstance(w, float)
+            self.assertGreater(w, 0)
+        w, bands, r = optimal_pstable_bands(1.0, 12, widths=[2.0])
+        self.assertEqual(w, 2.0)
+
+    def test_banding(self):
+        rng = np.random.default_rng(0)
+        X = rng.standard_normal((40, 20)) * 10
+        X[1::2] = X[::2] + 0.01 * rng.standard_normal((20, 20))
+        signatures = pstable_signatures(X, 32, 4.0)
+        self.assertTrue(np.any(signatures < 0))
+        lsh = LSH(signatures, backend='numpy')
+        lsh.make_bands(8)
+        lsh.get_buckets()
+        pairs = set(map(tuple, lsh.candidate_pairs().tolist()))
+        self.assertTrue({(i, i + 1) for i in range(0, 40, 2)} <= pairs)
+        for i in range(0, 40, 2):
+            self.assertIn(i + 1, lsh.query(signatures[i]))
+
+
+class LSHIndexTests(unittest.TestCase):
+
+    def test_insert_many(self):
+        signature = _signature_matrix(n_docs=8)
+        index = LSHIndex(8, 4)
+        index.insert_many(range(6), signature[:6])
+        self.assertEqual(len(index), 6)
+        self.assertEqual(index.query(signature[0]), {0, 1})
+
+        invalid = [
+            ([6, 7, 6], signature[5:8]),  # repeated in the batch
+            ([6, 0], signature[6:8]),  # already indexed
+            ([6, 7, 8], signature[6:8]),  # more ids than signatures
+            ([6], signature[6:8]),  # fewer ids than signatures
+        ]
+        for doc_ids, signatures in invalid:
+            with self.assertRaises(ValueError):
+                index.insert_many(doc_ids, signatures)
+            self.assertEqual(len(index), 6)
+            self.assertNotIn(6, index)
+            self.assertEqual(index.query(signature[6]), set())
+
+        index.remove(0)
+        index.insert(0, signature[0])
+        self.assertEqual(index.query(signature[0]), {0, 1})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,3 +1,4 @@
 """Module for stream mining"""
 
 from ._stream_mining import alonMatiasSzegedy, flajoletMartin
+from ._dedup import stream_dedup
@@ -0,0 +1,134 @@
+"""Near-duplicate detection over a stream of documents"""
+
+import time
+from collections import deque
+from itertools import islice
+
+import numpy as np
+
+from ..feature_extraction import get_signatures, word_shingles
+from ..feature_extraction._hashing import hash_texts
+from ..similarity import LSHIndex
+
+
+def _micro_batches(stream, batch_size):
+    """Yield lists of at most `batch_size` elements of the stream"""
+    stream = iter(stream)
+    while True:
+        batch = list(islice(stream, batch_size))
+        if not batch:
+            return
+        yield batch
+
+
+def stream_dedup(stream, shingle_size, num_shingle_bucket, num_hash, bands,
+                 threshold=None, batch_size=256, window_size=None,
+                 window_seconds=None, stop_words=None, seed=1337,
+                 hash_method='sha1', method='minhash'):
+    """
+    Detect near-duplicate documents as they arrive in a stream
+
+    Documents are shingled and minhashed in micro-batches. Each document
+    is then, in arrival order, queried against an `LSHIndex` of the
+    documents in the window, verified by the fraction of agreeing
+    signature values and inserted into the index. Documents more than
+    `window_seconds` older than the arriving document are evicted before
+    it is queried, and the oldest documents are evicted once the window
+    exceeds `window_size` documents, so that memory stays bounded.
+
+    Parameters
+    ----------
+    stream : iterable
+        Iterable of `(doc_id, text)` tuples, or `(doc_id, text,
+        timestamp)` tuples with the timestamp in seconds. Without a
+        timestamp, the time at which the micro-batch is processed is
+        used. Identifiers should be unique within the window.
+    shingle_size : int
+        Shingle size to use for hashed word shingle extraction
+    num_shingle_bucket : int
+        The number defining the bucket size for word shingles. This is
+        equal to 2**n - 1
+    num_hash : int
+        Number of signature values per document
+    bands : int
+        Number of bands. Must be a factor of `num_hash`.
+    threshold : float, default=None
+        Minimum estimated Jaccard similarity of a match. If None, the
+        approximate threshold (1/b)**(1/r) of the banding is used.
+    batch_size : int, default=256
+        Number of documents shingled and minhashed at once. Matches of a
+        document are yielded once its micro-batch is processed; use 1
+        for the lowest latency.
+    window_size : int, default=None
+        Maximum number of documents kept in the index. If None, the
+        count of documents is not bounded.
+    window_seconds : float, default=None
+        Maximum age in seconds of the documents kept in the index. If
+        None, the age of documents is not bounded.
+    stop_words : iterable of str, default=None
+        Stop words used by `word_shingles`
+    seed : int, default=1337
+        Random seed of the signatures
+    hash_method : str or callable, default='sha1'
+        Hash function used to hash the word shingles into buckets
+    method : {'minhash', 'one_permutation'}, default='minhash'
+        Signature scheme, see `get_signatures`
+
+    Yields
+    ------
+    match : tuple
+        `(doc_id, match_id, similarity)` for each earlier document
+        `match_id` in the window whose estimated similarity with the
+        arriving document `doc_id` is at least `threshold`, in order of
+        decreasing similarity
+    """
+    r = num_hash // bands
+    if threshold is None:
+        threshold = (1 / bands) ** (1 / r)
+    index = LSHIndex(bands, r)
+    signatures = {}
+    window = deque()
+
+    for batch in _micro_batches(stream, batch_size):
+        now = time.time()
+        ids, stamps, texts = [], [], []
+        offsets = [0]
+        for element in batch:
+            doc_shingles = word_shingles(element[1], shingle_size, stop_words)
+            if len(doc_shingles) > 0:
+                ids.append(element[0])
+                stamps.append(element[2] if len(element) > 2 else now)
+                texts.extend(doc_shingles)
+                offsets.append(len(texts))
+        if not ids:
+            continue
+        # Hash the shingles of the whole micro-batch at once
+        hashed = hash_texts(texts, num_shingle_bucket, hash_method)
+        shingles = [hashed[lo:hi] for lo, hi in zip(offsets[:-1], offsets[1:])]
+        batch_signatures = get_signatures(shingles, num_hash, seed=seed,
+                                          method=method)
+
+        for doc_id, stamp, signature in zip(ids, stamps, batch_signatures):
+            # drop the documents too old for the arriving one before
+            # querying, so that none of them can be reported as a match
+            while (window_seconds is not None and window
+                   and window[0][1] < stamp - window_seconds):
+                old_id, _ = window.popleft()
+                index.remove(old_id)
+                del signatures[old_id]
+
+            candidates = list(index.query(signature))
+            if candidates:
+                sims = (np.array([signatures[c] for c in candidates])
+                        == signature).mean(axis=1)
+                for i in np.argsort(-sims, kind='stable'):
+                    if sims[i] >= threshold:
+                        yield doc_id, candidates[i], float(sims[i])
+
+            index.insert(doc_id, signature)
+            signatures[doc_id] = signature
+            window.append((doc_id, stamp))
+            while window_size is not None and len(window) > window_size:
+                old_id, _ = window.popleft()
+                index.remove(old_id)
+                del signatures[old_id]
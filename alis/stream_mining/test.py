@@ -0,0 +1,57 @@
+import unittest
+from alis.stream_mining import *
+
+TEXTS = [
+    'the quick brown fox jumps over the lazy dog and runs into the woods',
+    'a cat sat on the mat in the house of the old man by the river bank',
+    'we will go to the market in the morning and buy some of the apples',
+]
+
+
+def _run(stream, **kwargs):
+    params = dict(shingle_size=2, num_shingle_bucket=31, num_hash=32,
+                  bands=16)
+    params.update(kwargs)
+    return list(stream_dedup(stream, **params))
+
+
+class StreamDedupTests(unittest.TestCase):
+
+    def test_matches(self):
+        stream = [(0, TEXTS[0]), (1, TEXTS[1]), (2, TEXTS[0]),
+                  (3, TEXTS[2]), (4, TEXTS[1])]
+        self.assertEqual(_run(stream), [(2, 0, 1.0), (4, 1, 1.0)])
+        self.assertEqual(_run([(0, TEXTS[0]), (1, 'no shingles')]), [])
+
+    def test_count_eviction(self):
+        stream = [(0, TEXTS[0]), (1, TEXTS[1]), (2, TEXTS[0]),
+                  (3, TEXTS[0])]
+        self.assertEqual(_run(stream, window_size=1), [(3, 2, 1.0)])
+        self.assertEqual(_run(stream, window_size=2),
+                         [(2, 0, 1.0), (3, 2, 1.0)])
+
+    def test_time_eviction(self):
+        stream = [(t, TEXTS[0], float(t)) for t in range(5)]
+        matches = _run(stream, window_seconds=1.5)
+        self.assertEqual(matches, [(t, t - 1, 1.0) for t in range(1, 5)])
+        matches = _run(stream, window_seconds=2)
+        self.assertEqual(
+            sorted(matches),
+            [(1, 0, 1.0), (2, 0, 1.0), (2, 1, 1.0), (3, 1, 1.0),
+             (3, 2, 1.0), (4, 2, 1.0), (4, 3, 1.0)])
+
+    def test_micro_batches(self):
+        stream = [(i, TEXTS[i % 3], float(i)) for i in range(10)]
+        expected = _run(stream, batch_size=1, window_seconds=4)
+        self.assertGreater(len(expected), 0)
+        for batch_size in [2, 3, 256]:
+            self.assertEqual(
+                _run(stream, batch_size=batch_size, window_seconds=4),
+                expected)
+            self.assertEqual(
+                _run(stream, batch_size=batch_size, window_size=3),
+                _run(stream, batch_size=1, window_size=3))
+
+
+if __name__ == '__main__':
+    unittest.main()
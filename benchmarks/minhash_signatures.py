@@ -0,0 +1,61 @@
+"""
+Benchmark of the signature schemes of `alis.feature_extraction.minhash`.
+
+Pairs of synthetic documents with a known Jaccard similarity are built
+from the bundled word list. For each scheme, the signature throughput
+and the mean absolute error of the Jaccard estimate (fraction of equal
+signature values) against the exact similarity are reported.
+
+Usage: python benchmarks/minhash_signatures.py [num_pairs] [num_hash]
+"""
+
+import os
+import sys
+import time
+
+import numpy as np
+
+from alis.feature_extraction import get_signatures, hashed_word_shingles
+
+WORDS_PATH = os.path.join(
+    os.path.dirname(__file__), '..', 'alis', 'datasets', 'data', 'words.txt')
+
+
+def make_pairs(num_pairs, words_per_doc=300, seed=0):
+    """Return pairs of shingle sets with a random amount of overlap and
+    their exact Jaccard similarities"""
+    with open(WORDS_PATH) as f:
+        words = f.read().split()
+    words = np.array(words[:5000] + ['the', 'a', 'of', 'and', 'in'] * 200)
+    rng = np.random.default_rng(seed)
+    documents, similarities = [], []
+    for _ in range(num_pairs):
+        text = rng.choice(words, words_per_doc)
+        edited = text.copy()
+        changed = rng.random(words_per_doc) < rng.random()
+        edited[changed] = rng.choice(words, changed.sum())
+        first = hashed_word_shingles(' '.join(text), 3, 32)
+        second = hashed_word_shingles(' '.join(edited), 3, 32)
+        documents += [first, second]
+        similarities.append(len(first & second) / len(first | second))
+    return documents, np.array(similarities)
+
+
+def main(num_pairs=1000, num_hash=256):
+    documents, similarities = make_pairs(num_pairs)
+    n_shingles = sum(len(doc) for doc in documents)
+    print(f'{len(documents):,} documents, {n_shingles:,} shingles, '
+          f'{num_hash} signature values')
+    print(f'{"method":>16} {"time (s)":>10} {"docs/s":>12} {"MAE":>8}')
+    for method in ['minhash', 'one_permutation']:
+        start = time.perf_counter()
+        signatures = get_signatures(documents, num_hash, method=method)
+        elapsed = time.perf_counter() - start
+        estimates = (signatures[::2] == signatures[1::2]).mean(axis=1)
+        error = np.abs(estimates - similarities).mean()
+        print(f'{method:>16} {elapsed:>10.3f} '
+              f'{len(documents) / elapsed:>12,.0f} {error:>8.4f}')
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
@@ -0,0 +1,69 @@
+"""
+Benchmark of the shingle hashing backends of
+`alis.feature_extraction.shingles`.
+
+Synthetic documents are built from the bundled word list and the number
+of hashed shingles per second is reported for each backend, both when
+hashing document by document (as `hashed_word_shingles` does) and when
+hashing all shingles in a single batch.
+
+Usage: python benchmarks/shingle_hashing.py [num_docs] [words_per_doc]
+"""
+
+import os
+import sys
+import time
+
+import numpy as np
+
+from alis.feature_extraction import k_shingles, word_shingles
+from alis.feature_extraction._hashing import HASH_METHODS, hash_texts
+
+WORDS_PATH = os.path.join(
+    os.path.dirname(__file__), '..', 'alis', 'datasets', 'data', 'words.txt')
+
+
+def make_documents(num_docs, words_per_doc, seed=0):
+    """Return random documents made up of words and English stop words"""
+    with open(WORDS_PATH) as f:
+        words = f.read().split()
+    vocabulary = np.array(words[:5000] + ['the', 'a', 'of', 'and', 'in'] * 200)
+    rng = np.random.default_rng(seed)
+    return [' '.join(rng.choice(vocabulary, words_per_doc))
+            for _ in range(num_docs)]
+
+
+def shingles_per_second(documents, hash_method):
+    """Return the per-document and single-batch hashing throughput"""
+    n_shingles = sum(len(doc) for doc in documents)
+
+    start = time.perf_counter()
+    for doc in documents:
+        hash_texts(doc, 32, hash_method)
+    per_doc = n_shingles / (time.perf_counter() - start)
+
+    flat = [shingle for doc in documents for shingle in doc]
+    start = time.perf_counter()
+    hash_texts(flat, 32, hash_method)
+    batch = n_shingles / (time.perf_counter() - start)
+    return per_doc, batch
+
+
+def main(num_docs=2000, words_per_doc=300):
+    texts = make_documents(num_docs, words_per_doc)
+    corpora = {
+        'word 3-shingles': [list(word_shingles(t, 3)) for t in texts],
+        'char 5-shingles': [list(k_shingles(t, 5)) for t in texts],
+    }
+    for name, documents in corpora.items():
+        n_shingles = sum(len(doc) for doc in documents)
+        print(f'{name}: {n_shingles:,} shingles in {num_docs:,} documents')
+        print(f'{"backend":>10} {"per doc (/s)":>16} {"batched (/s)":>16}')
+        for hash_method in HASH_METHODS:
+            per_doc, batch = shingles_per_second(documents, hash_method)
+            print(f'{hash_method:>10} {per_doc:>16,.0f} {batch:>16,.0f}')
+        print()
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))